@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+"""
+=====================
+Subgraph Benchmarking
+=====================
+
+:Author:
+    Moritz Emanuel Beber
+:Date:
+    2011-06-20
+:Copyright:
+    Copyright(c) 2011 Jacobs University of Bremen. All rights reserved.
+:File:
+    benchmark.py
+
+Notes
+-----
+Times the census engines of the subgraphs module on synthetic directed graphs
+and writes the results as JSON, e.g.,
+
+    python -m meb.utils.network.benchmark -o new.json -c old.json
+
+compares a run against an earlier one and reports slower modes.
+"""
+
+
+import os
+import sys
+import time
+import json
+import platform
+import itertools
+import subprocess
+import multiprocessing
+import numpy
+import networkx as nx
+
+from . import subgraphs as sub
+
+
+def synthetic_digraph(num_nodes, num_edges, skew=0.0, seed=None):
+    """
+    Creates a random directed graph with a given number of links whose degrees
+    follow the node weights (i + 1)^(-skew), i.e., a uniform random graph for
+    no skew and increasingly heterogeneous degrees for larger values.
+
+    Parameters
+    ----------
+    num_nodes: int
+        Number of nodes, labelled from 0 to num_nodes - 1.
+    num_edges: int
+        Number of distinct directed links without self-links.
+    skew: float (optional)
+        Exponent of the node weights.
+    seed: int (optional)
+        Define a fixed seed for the random number generator, for repeatable
+        experiments.
+
+    Returns
+    -------
+    networkx.DiGraph
+    """
+    if seed:
+        numpy.random.seed(seed)
+    max_edges = num_nodes * (num_nodes - 1)
+    if num_edges > max_edges:
+        raise nx.NetworkXError("too many links for %d nodes" % num_nodes)
+    weights = numpy.power(numpy.arange(1, num_nodes + 1, dtype=float), -skew)
+    weights /= weights.sum()
+    keys = numpy.zeros(0, dtype=numpy.int64)
+    while len(keys) < num_edges:
+        draw = 2 * (num_edges - len(keys)) + 16
+        src = numpy.random.choice(num_nodes, draw, p=weights)
+        tar = numpy.random.choice(num_nodes, draw, p=weights)
+        new = (src * num_nodes + tar)[src != tar]
+        keys = numpy.union1d(keys, new)
+    keys = numpy.random.permutation(keys)[:num_edges]
+    graph = nx.DiGraph(name="synthetic graph")
+    graph.add_nodes_from(xrange(num_nodes))
+    graph.add_edges_from(itertools.izip((keys // num_nodes).tolist(),
+        (keys % num_nodes).tolist()))
+    return graph
+
+def _triadic(graph, mapping, **kw_args):
+    census = sub.triadic_census(graph, **kw_args)
+    return sum(census[name] for name in sub.triad_names[3:])
+
+def _mapped(graph, mapping, **kw_args):
+    return _triadic(graph, mapping, m=mapping, **kw_args)
+
+def _compressed(graph, mapping, **kw_args):
+    return _triadic(sub.CompressedDiGraph(graph), mapping, **kw_args)
+
+def _participation(graph, mapping):
+    census = sub.triad_participation(graph)[0]
+    return sum(census.itervalues())
+
+def _approximate(graph, mapping):
+    census = sub.approximate_triadic_census(graph, samples=10000)[0]
+    return sum(census.itervalues())
+
+def _tetradic(graph, mapping):
+    return sum(sub.tetradic_census(graph).itervalues())
+
+# name, function, keyword arguments
+census_modes = (
+    ("default", _triadic, dict()),
+    ("disconnected", _triadic, dict(count_disconnected=True)),
+    ("mapped", _mapped, dict()),
+    ("mapped_disconnected", _mapped, dict(count_disconnected=True)),
+    ("compressed", _compressed, dict()),
+    ("compressed_disconnected", _compressed, dict(count_disconnected=True)),
+    ("parallel", _compressed, dict(n_jobs=None)),
+    ("participation", _participation, dict()),
+    ("approximate", _approximate, dict()),
+    ("tetradic", _tetradic, dict()),
+)
+
+# modes only run when requested, the four-node census takes minutes per run on
+# the largest default graph
+optional_modes = ("tetradic",)
+
+def _peak_rss():
+    """
+    Peak resident set size of the current process in bytes.
+    """
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peak
+    return peak * 1024
+
+def _measure(function, graph, mapping, kw_args, repeat, queue):
+    try:
+        baseline = _peak_rss()
+        times = list()
+        for i in xrange(repeat):
+            start = time.time()
+            found = function(graph, mapping, **kw_args)
+            times.append(time.time() - start)
+        queue.put((times, found, _peak_rss() - baseline, None))
+    except StandardError as err:
+        queue.put((None, None, None, repr(err)))
+
+def time_mode(name, graph, repeat=3):
+    """
+    Time one census mode in a separate process so that its peak memory can be
+    measured in isolation.
+
+    Returns
+    -------
+    dict:
+        Timings in seconds, the number of subgraphs found, the throughput in
+        subgraphs per second, the peak memory increase in bytes and the number
+        of processes actually used.
+    """
+    (function, kw_args) = dict((mode[0], mode[1:]) for mode in\
+            census_modes)[name]
+    mapping = dict(itertools.izip(graph.nodes_iter(), itertools.count()))
+    queue = multiprocessing.Queue()
+    worker = multiprocessing.Process(target=_measure, args=(function, graph,
+        mapping, kw_args, repeat, queue))
+    worker.start()
+    (times, found, memory, error) = queue.get()
+    worker.join()
+    # None means all CPUs and a single one falls back to the serial engine
+    n_jobs = kw_args.get("n_jobs", 1)
+    if n_jobs is None:
+        n_jobs = multiprocessing.cpu_count()
+    if error is not None:
+        return {"mode": name, "error": error, "n_jobs": n_jobs}
+    best = min(times)
+    return {"mode": name, "times": times, "best": best,
+            "mean": numpy.mean(times), "subgraphs": found,
+            "throughput": (found / best) if best > 0.0 else None,
+            "peak_memory": memory, "n_jobs": n_jobs}
+
+def run_benchmarks(sizes=((1000, 10000, 0.0), (1000, 10000, 1.0),
+        (10000, 100000, 0.5)), modes=None, repeat=3, seed=1):
+    """
+    Time census modes on synthetic graphs.
+
+    Parameters
+    ----------
+    sizes: iterable
+        Triples of number of nodes, number of links and degree skew.
+    modes: iterable (optional)
+        Names of the modes in `census_modes` to run, by default all but the
+        `optional_modes`.
+    repeat: int (optional)
+        Number of timed runs per mode and graph.
+    seed: int (optional)
+        Seed for generating the graphs.
+
+    Returns
+    -------
+    dict:
+        Meta information and a list of results per graph and mode.
+    """
+    if modes is None:
+        modes = [mode[0] for mode in census_modes if not mode[0] in\
+                optional_modes]
+    results = list()
+    for (num_nodes, num_edges, skew) in sizes:
+        graph = synthetic_digraph(num_nodes, num_edges, skew, seed=seed)
+        for name in modes:
+            res = time_mode(name, graph, repeat)
+            res.update(nodes=num_nodes, edges=num_edges, skew=skew)
+            results.append(res)
+    try:
+        revision = subprocess.check_output(["git", "rev-parse", "HEAD"],
+                stderr=subprocess.STDOUT,
+                cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {"revision": revision, "python": platform.python_version(),
+            "platform": platform.platform(), "date": time.strftime("%Y-%m-%d"
+            " %H:%M:%S"), "cpus": multiprocessing.cpu_count(),
+            "repeat": repeat, "seed": seed, "results": results}
+
+def compare_benchmarks(baseline, current, tolerance=0.1):
+    """
+    Find modes whose best time increased by more than a fraction `tolerance`.
+    Results that used a different number of processes are not compared.
+
+    Parameters
+    ----------
+    baseline, current: dict
+        Results of `run_benchmarks`, e.g., as loaded from JSON.
+
+    Returns
+    -------
+    list:
+        Tuples of mode, nodes, links, skew, baseline and current best time.
+    """
+    def _key(res):
+        return (res["mode"], res["nodes"], res["edges"], res["skew"])
+
+    before = dict((_key(res), res) for res in baseline["results"] if "best" in
+            res)
+    slower = list()
+    for res in current["results"]:
+        old = before.get(_key(res))
+        if old is None or "best" not in res:
+            continue
+        if old.get("n_jobs") != res.get("n_jobs"):
+            continue
+        if res["best"] > old["best"] * (1.0 + tolerance):
+            slower.append(_key(res) + (old["best"], res["best"]))
+    return slower
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmark census modes.")
+    parser.add_argument("-o", "--output", default="census_benchmark.json",
+            help="JSON file to write results to")
+    parser.add_argument("-c", "--compare", help="earlier JSON results")
+    parser.add_argument("-m", "--modes", nargs="+", help="modes to run, by"
+            " default all but %s" % ", ".join(optional_modes))
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    parser.add_argument("-t", "--tolerance", type=float, default=0.1)
+    parser.add_argument("-s", "--size", nargs=3, action="append",
+            metavar=("NODES", "LINKS", "SKEW"), help="graph size (repeatable)")
+    args = parser.parse_args(argv)
+    kw_args = dict(modes=args.modes, repeat=args.repeat)
+    if args.size:
+        kw_args["sizes"] = [(int(n), int(e), float(k)) for (n, e, k) in\
+                args.size]
+    report = run_benchmarks(**kw_args)
+    with open(args.output, "w") as file_h:
+        json.dump(report, file_h, indent=2)
+    for res in report["results"]:
+        if "error" in res:
+            print res["mode"], res["nodes"], res["edges"], res["skew"],\
+                    "failed:", res["error"]
+        else:
+            print res["mode"], res["nodes"], res["edges"], res["skew"],\
+                    "best %.4f s" % res["best"], "%.1f subgraphs/s" %\
+                    (res["throughput"] or 0.0), "%d bytes" %\
+                    res["peak_memory"], "%d jobs" % res["n_jobs"]
+    if args.compare:
+        with open(args.compare, "r") as file_h:
+            baseline = json.load(file_h)
+        slower = compare_benchmarks(baseline, report, args.tolerance)
+        for entry in slower:
+            print "slower:", entry[0], entry[1], entry[2], entry[3],\
+                    "%.4f s -> %.4f s" % entry[4:]
+        return 1 if slower else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
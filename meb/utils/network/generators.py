@@ -21,6 +21,7 @@ Network Generators
 from . import classes
 import warnings
 import numpy
+import networkx as nx
 
 
 def rbp_network(top, bottom, p, directed=False, seed=None):
@@ -75,3 +76,68 @@ def rbp_network(top, bottom, p, directed=False, seed=None):
                     network.add_edge(src, tar)
     return network
 
+def directed_configuration_model(in_degrees, out_degrees, method="erase",
+        as_graph=True, max_tries=100, seed=None):
+    """
+    Creates a random directed graph with given in- and out-degree sequences by
+    pairing randomly permuted link stubs. Pairs that form self-links or
+    parallel links are either erased, which slightly lowers some degrees, or
+    the whole pairing is rejected and drawn again.
+
+    Parameters
+    ----------
+    in_degrees: iter
+        In-degree of each node, nodes are labelled from 0 to n - 1.
+    out_degrees: iter
+        Out-degree of each node, with the same sum as `in_degrees`.
+    method: str (optional)
+        Either "erase" or "reject".
+    as_graph: bool (optional)
+        Return a networkx.DiGraph or only the (number of links x 2) array of
+        sources and targets.
+    max_tries: int (optional)
+        Maximum number of pairings drawn with method "reject".
+    seed: int (optional)
+        Define a fixed seed for the random number generator, for repeatable
+        experiments.
+
+    Returns
+    -------
+    tuple:
+        The graph or link array and the rejection rate, i.e., the fraction of
+        erased stub pairs or of rejected pairings.
+    """
+    if seed:
+        numpy.random.seed(seed)
+    in_degrees = numpy.asarray(in_degrees, dtype=numpy.int64)
+    out_degrees = numpy.asarray(out_degrees, dtype=numpy.int64)
+    num_nodes = len(in_degrees)
+    if len(out_degrees) != num_nodes:
+        raise nx.NetworkXError("degree sequences differ in length")
+    if in_degrees.sum() != out_degrees.sum():
+        raise nx.NetworkXError("degree sequences differ in their sums")
+    if method not in ("erase", "reject"):
+        raise ValueError("unknown method '%s'" % method)
+    nodes = numpy.arange(num_nodes, dtype=numpy.int64)
+    src = numpy.repeat(nodes, out_degrees)
+    tar_stubs = numpy.repeat(nodes, in_degrees)
+    num_stubs = len(src)
+    for tries in xrange(1, max_tries + 1):
+        tar = numpy.random.permutation(tar_stubs)
+        keys = src * num_nodes + tar
+        keys = numpy.unique(keys[src != tar])
+        if method == "erase":
+            rate = float(num_stubs - len(keys)) / num_stubs if num_stubs else 0.0
+            break
+        if len(keys) == num_stubs:
+            rate = float(tries - 1) / tries
+            break
+    else:
+        raise nx.NetworkXError("no simple graph in %d tries" % max_tries)
+    links = numpy.column_stack((keys // num_nodes, keys % num_nodes))
+    if not as_graph:
+        return (links, rate)
+    network = nx.DiGraph(name="directed configuration model")
+    network.add_nodes_from(xrange(num_nodes))
+    network.add_edges_from(links.tolist())
+    return (network, rate)
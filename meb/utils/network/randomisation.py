@@ -18,6 +18,8 @@ Network Rewiring
 """
 
 
+import os
+import time
 import numpy
 import networkx as nx
 
@@ -80,6 +82,32 @@ def selflinks_directed_groups(graph):
             uni.append(edge)
     return [[uni, 1], [bi, 2]]
 
+def standard_undirected_groups(graph):
+    """
+    Makes one category of all undirected links, each in both directions, so
+    that pairs of them are switched like bidirectional links.
+    """
+    if graph.number_of_selfloops() > 0:
+        raise nx.NetworkXError("the standard setup does not allow self-links")
+    links = graph.edges()
+    return [[links + [(v, u) for (u, v) in links], 2]]
+
+def bipartite_undirected_groups(graph):
+    """
+    Makes one category of undirected links pointing from the nodes with `pop`
+    1 to those with `pop` -1, switching them keeps links between populations.
+    """
+    links = list()
+    pop = graph.node
+    for (u, v) in graph.edges_iter():
+        if pop[u]["pop"] == pop[v]["pop"]:
+            raise nx.NetworkXError("link within population %d" % pop[u]["pop"])
+        if pop[u]["pop"] == 1:
+            links.append((u, v))
+        else:
+            links.append((v, u))
+    return [[links, 1]]
+
 def check_standard(graph, first, second):
     """
     Standard rewiring conditions as in original theory.
@@ -109,6 +137,40 @@ def check_standard(graph, first, second):
 
 class NetworkRewiring(object):
     """
+    Degree preserving randomisation by switching links.
+
+    Attributes
+    ----------
+    census: object (optional)
+        An object with `attach(graph, same_as)`, `add_edge(src, tar)` and
+        `remove_edge(src, tar)` methods, e.g., a
+        `subgraphs.IncrementalTriadicCensus`, that performs all link changes
+        and thus keeps statistics up to date along the rewiring.
+    track: numpy.ndarray
+        For each link group of the last switching run the expected switches,
+        attempts left, successful switches and number of links - 1.
+    checkpoint: str (optional)
+        Path of a file to which the complete state of a switching run is saved
+        regularly, see `resume`.
+    checkpoint_interval: int
+        Minimum number of switching attempts between checkpoints.
+    overlay: bool
+        If True, `randomise`, `sample` and `resume` with `copy` switch links
+        in and return an `OverlayGraph` of the template instead of a copy. It
+        serves the census functions directly and a full graph only needs to
+        be built by its `materialise` method if at all. A census is not
+        supported together with an overlay.
+    trace_interval: int (optional)
+        If set, the number of switching attempts between the records of
+        `trace`.
+    trace: numpy.ndarray
+        Structured array recording the last switching run if `trace_interval`
+        is set. Each record holds the attempts so far ("attempts"), seconds
+        since the start ("seconds"), attempts per second since the previous
+        record ("throughput"), attempts and successful switches so far per
+        group ("group_attempts", "group_successes") and the fraction of
+        links in the groups that were present before the first run on them
+        ("original"), a cheap indicator of mixing.
     """
 
     def __init__(self):
@@ -118,11 +180,32 @@ class NetworkRewiring(object):
         self.conditions = check_standard
         self.make_groups = standard_directed_groups
         self.graph = None
+        self.census = None
+        self.track = None
+        # row of each link in the bidirectional groups keyed by group id
+        self._positions = dict()
+        # number of attempts for which random numbers are drawn at once
+        self.batch_size = 2**14
+        self.checkpoint = None
+        self.checkpoint_interval = 10**7
+        self.overlay = False
+        self.trace_interval = None
+        self.trace = None
+        # sorted packed keys of the links before switching and their base
+        self._initial = None
+        self._key_base = 1
 
     def _add_edge(self, src, tar, bunch, i):
         """
         """
-        self.graph.add_edge(src, tar)
+        if self.census is None:
+            self.graph.add_edge(src, tar)
+        else:
+            self.census.add_edge(src, tar)
+        rows = self._positions.get(id(bunch))
+        if rows is not None:
+            del rows[tuple(bunch[i].tolist())]
+            rows[(src, tar)] = i
         # over-write old edge
         bunch[i, 0] = src
         bunch[i, 1] = tar
@@ -130,20 +213,19 @@ class NetworkRewiring(object):
     def _remove_edge(self, src, tar, bunch):
         """
         """
-        self.graph.remove_edge(src, tar)
+        if self.census is None:
+            self.graph.remove_edge(src, tar)
+        else:
+            self.census.remove_edge(src, tar)
 
     def _switch_double(self, first, second, group, u, v):
         """
         """
-        # find the reverse edges for u and v
-        # indices of target(first)
-        x = numpy.nonzero(group[:, 0] == first[1])[0]
-        # intersection with indices of source(first) to find index
-        x = x[numpy.nonzero(group[x, 1].flatten() == first[0])[0]]
-        # similarly
-        y = numpy.nonzero(group[:, 0] == second[1])[0]
-        y = y[numpy.nonzero(group[y, 1].flatten() == second[0])[0]]
         if self.conditions(self.graph, first, second):
+            # find the rows of the reverse edges for u and v
+            rows = self._positions[id(group)]
+            x = rows[(first[1], first[0])]
+            y = rows[(second[1], second[0])]
             # if all of these conditions are met, switch double edge
             # add the forward direction
             self._add_edge(first[0], second[1], group, u)
@@ -192,61 +274,1019 @@ class NetworkRewiring(object):
         Network Motifs: Simple Building Blocks of Complex Networks
         Science, 298:824-827 (2002)
         """
+        self._working_graph(template, copy)
+        if not self.graph.size():
+            return (self.graph, 0.0)
+        success = self._rewire(self.make_groups(template), flip)
+        return (self.graph, success)
+
+    def sample(self, template, num, flip=100, thin=10, copy=True,
+            snapshot=False):
+        """
+        Generates an ensemble of randomised networks from a single switching
+        chain. After a burn-in of `flip` switching attempts per link, each
+        further sample follows `thin` attempts per link after the previous one.
+
+        Parameters
+        ----------
+        template: directed graph
+            The network to randomise.
+        num: int
+            Number of samples.
+        flip: int (optional)
+            Switching attempts per link for the burn-in.
+        thin: int (optional)
+            Switching attempts per link between consecutive samples.
+        copy: bool (optional)
+            Switch links in a copy of the template or the template itself.
+        snapshot: bool (optional)
+            Yield a read-only (number of links x 2) array of the links in all
+            groups instead of the graph that is being switched.
+
+        Returns
+        -------
+        generator:
+            Tuples of sample and ratio of successful to expected switches since
+            the previous sample. The successful and expected switches per group
+            are in `track` (columns 2 and 0). A yielded graph is changed by the
+            following switches, copy it if it needs to be kept.
+        """
+        sets = self._sample_groups(template, copy)
+        self._prepare(sets)
+        self._run(sets, self._track(sets, flip))
+        for i in xrange(num):
+            success = self._run(sets, self._track(sets, thin))
+            if snapshot:
+                yield (self._snapshot(sets), success)
+            else:
+                yield (self._sample_graph(), success)
+
+    def _sample_groups(self, template, copy):
+        """
+        Set up `graph` for `sample` and return its link groups.
+        """
+        self._working_graph(template, copy)
+        return self.make_groups(template)
+
+    def _working_graph(self, template, copy):
+        """
+        Set `graph` to the template, a copy or an overlay of it.
+        """
         if template.is_multigraph():
             raise nx.NetworkXError("not defined for multigraphs")
-        if copy:
+        if self.overlay and self.census is not None:
+            raise nx.NetworkXError("a census is not supported with an overlay")
+        if copy and self.overlay:
+            self.graph = OverlayGraph(template)
+        elif copy:
             self.graph = template.copy()
         else:
             self.graph = template
-        if not self.graph.size():
-            return (self.graph, 0.0)
-        sets = self.make_groups(self.graph)
-        len_sets = len(sets)
-        # set up progress tracking
+        if self.census is not None:
+            self.census.attach(self.graph, template)
+
+    def _sample_graph(self):
+        return self.graph
+
+    def _snapshot(self, sets):
+        """
+        Read-only copy of the links in all groups.
+        """
+        links = numpy.concatenate([group.reshape(-1, 2) for (group, weight)\
+                in sets] or [numpy.zeros((0, 2), dtype=int)])
+        links.setflags(write=False)
+        return links
+
+    def _rewire(self, sets, flip):
+        """
+        Switch links within each group and return the ratio of successful to
+        expected switches.
+        """
+        self._prepare(sets)
+        return self._run(sets, self._track(sets, flip))
+
+    def _prepare(self, sets):
+        """
+        Convert link groups to two dimensional arrays and index the rows of
+        bidirectional links.
+        """
+        for pair in sets:
+            pair[0] = numpy.asarray(pair[0])
+        self._positions = dict((id(group), dict((tuple(link), row) for\
+                (row, link) in enumerate(group.tolist()))) for (group, weight)\
+                in sets if weight == 2)
+        self._initial = None
+        if self.trace_interval:
+            self._initial = self._link_keys(sets)
+            if self._initial is not None:
+                self._initial.sort()
+
+    def _link_keys(self, sets):
+        """
+        Links of all groups as packed integer keys or None for other nodes.
+        """
+        links = [group.reshape(-1, 2) for (group, weight) in sets]
+        if not links or not all(issubclass(group.dtype.type, numpy.integer)\
+                for group in links):
+            return None
+        links = numpy.concatenate(links).astype(numpy.int64)
+        if self._initial is not None:
+            base = self._key_base
+        else:
+            self._key_base = base = int(links.max()) + 1 if len(links) else 1
+        return links[:, 0] * base + links[:, 1]
+
+    def _trace_record(self, sets, attempts, seconds, throughput, left, done,
+            first_left, first_done):
+        """
+        One record of `trace`.
+        """
+        if self._initial is None:
+            original = numpy.nan
+        else:
+            keys = self._link_keys(sets)
+            original = numpy.in1d(keys, self._initial).mean() if len(keys)\
+                    else numpy.nan
+        return (attempts, seconds, throughput,
+                [a - b for (a, b) in zip(first_left, left)],
+                [a - b for (a, b) in zip(done, first_done)], original)
+
+    def _track(self, sets, flip):
+        """
+        Set up progress tracking.
+        """
         # the probability of switching a link in a certain group is proportional
         # to the number of flips left in that group
         # for each group we record:
         # expected flips, attempts left, successful flips
-        track = numpy.zeros(shape=(len_sets, 4), dtype=int)
+        track = numpy.zeros(shape=(len(sets), 4), dtype=int)
         for (i, (group, weight)) in enumerate(sets):
             w_group = len(group)
-            # convert links groups to two dimensional array
-            sets[i][0] = numpy.array(group)
             if w_group > weight:
                 track[i, 0] = flip * weight * w_group # expected flips
                 track[i, 1] = track[i, 0] # attempts left
                 # store number of links - 1 for inclusive randint range
                 track[i, 3] = w_group - 1
-        total_left = track[:, 1].sum()
-        try:
-            probs = [float(track[k, 1]) / float(total_left)\
-                    for k in xrange(len_sets)]
-        except ZeroDivisionError:
-            return (self.graph, 0.0)
-        # randomly rewire groups depending on their probability
+        return track
+
+    def _run(self, sets, track):
+        """
+        Perform the attempts left in `track` and return the ratio of successful
+        to expected switches.
+        """
+        self.track = track
+        len_sets = len(sets)
+        total_left = int(track[:, 1].sum())
+        self.trace = None
+        if total_left == 0:
+            return 0.0
+        # plain lists are much faster to update than the tracking array
+        left = track[:, 1].tolist()
+        done = track[:, 2].tolist()
+        sizes = (track[:, 3] + 1).tolist()
+        interval = self.trace_interval
+        if interval:
+            total = total_left
+            records = [self._trace_record(sets, 0, 0.0, 0.0, left, done, left,
+                    done)]
+            first_left = list(left)
+            first_done = list(done)
+            start = last_time = time.time()
+            last = 0
+            next_record = interval
+        # random numbers are drawn in blocks: one to select the group
+        # proportional to its attempts left and two to select links
         uniform = numpy.random.random_sample
-        randint = numpy.random.random_integers
-        for i in xrange(total_left): # loop value is stored, so no problems
-            draw = uniform()
-            for j in xrange(len_sets):
-                if draw < float(sum(probs[:j + 1])):
-                    group = sets[j][0]
-                    (u, v) = randint(0, track[j, 3], 2) # two random links
-                    if sets[j][1] == 1:
-                        track[j, 2] += self._switch_single(tuple(group[u]),
-                                tuple(group[v]), group, u, v)
-                    elif sets[j][1] == 2:
-                        track[j, 2] += self._switch_double(tuple(group[u]),
-                                tuple(group[v]), group, u, v)
+        draws = list()
+        k = 0
+        since = 0
+        while total_left > 0:
+            if k == len(draws):
+                # between blocks the random state exactly reflects progress
+                since += k
+                if self.checkpoint is not None and\
+                        since >= self.checkpoint_interval:
+                    track[:, 1] = left
+                    track[:, 2] = done
+                    self._save_checkpoint(sets, track)
+                    since = 0
+                size = min(self.batch_size, total_left)
+                if interval:
+                    # blocks end at records, the random stream is unaffected
+                    attempts = total - total_left
+                    if attempts >= next_record:
+                        now = time.time()
+                        records.append(self._trace_record(sets, attempts,
+                                now - start, (attempts - last) / (now -\
+                                last_time) if now > last_time else numpy.inf,
+                                left, done, first_left, first_done))
+                        last = attempts
+                        last_time = now
+                        next_record += interval
+                    size = min(size, next_record - attempts)
+                draws = uniform((size, 3)).tolist()
+                k = 0
+            (draw, first, second) = draws[k]
+            k += 1
+            draw *= total_left
+            j = 0
+            cumulative = left[0]
+            while draw >= cumulative:
+                j += 1
+                cumulative += left[j]
+            group = sets[j][0]
+            u = int(first * sizes[j])
+            v = int(second * sizes[j])
+            if sets[j][1] == 1:
+                done[j] += self._switch_single(tuple(group[u].tolist()),
+                        tuple(group[v].tolist()), group, u, v)
+            elif sets[j][1] == 2:
+                done[j] += self._switch_double(tuple(group[u].tolist()),
+                        tuple(group[v].tolist()), group, u, v)
+            else:
+                raise nx.NetworkXError("unknown category")
+            total_left -= 1
+            left[j] -= 1
+        track[:, 1] = left
+        track[:, 2] = done
+        if interval:
+            now = time.time()
+            records.append(self._trace_record(sets, total, now - start,
+                    (total - last) / (now - last_time) if now > last_time else\
+                    numpy.inf, left, done, first_left, first_done))
+            self.trace = numpy.array(records, dtype=[("attempts", numpy.int64),
+                    ("seconds", float), ("throughput", float),
+                    ("group_attempts", numpy.int64, (len_sets,)),
+                    ("group_successes", numpy.int64, (len_sets,)),
+                    ("original", float)])
+        return float(track[:, 2].sum()) / float(track[:, 0].sum())
+
+
+    def _save_checkpoint(self, sets, track):
+        """
+        Write link groups, progress and random state to `checkpoint`.
+        """
+        (name, keys, pos, has_gauss, cached) = numpy.random.get_state()
+        arrays = dict(("group%d" % i, group) for (i, (group, weight)) in\
+                enumerate(sets))
+        arrays.update(self._checkpoint_arrays(sets))
+        # write to a temporary file first so that a run killed while saving
+        # leaves the previous checkpoint intact
+        tmp = self.checkpoint + ".tmp"
+        with open(tmp, "wb") as file_h:
+            numpy.savez_compressed(file_h, track=track,
+                    weights=numpy.array([weight for (group, weight) in sets]),
+                    rng_keys=keys, rng_pos=pos, rng_has_gauss=has_gauss,
+                    rng_cached=cached, **arrays)
+        os.rename(tmp, self.checkpoint)
+
+    def _checkpoint_arrays(self, sets):
+        """
+        Further named arrays to save with a checkpoint.
+        """
+        return dict()
+
+    def _restore_arrays(self, data, sets):
+        """
+        Restore the arrays of `_checkpoint_arrays` from loaded `data`.
+        """
+        pass
+
+    def resume(self, template, path, copy=True):
+        """
+        Finish a switching run from a checkpoint with the same result as the
+        uninterrupted run.
+
+        Parameters
+        ----------
+        template: directed graph
+            The network originally given to `randomise`.
+        path: str
+            A file written during the run because `checkpoint` was set.
+        copy: bool (optional)
+            Switch links in a copy of the template or the template itself.
+
+        Returns
+        -------
+        tuple:
+            The randomised graph and the ratio of successful to expected
+            switches over the whole run.
+
+        Notes
+        -----
+        Nodes need to be integers.
+        """
+        original = self._sample_groups(template, copy)
+        with numpy.load(path) as data:
+            weights = data["weights"].tolist()
+            if weights != [weight for (group, weight) in original]:
+                raise ValueError("checkpoint does not match the template")
+            sets = [[data["group%d" % i], weight] for (i, weight) in\
+                    enumerate(weights)]
+            track = data["track"]
+            self._restore_arrays(data, sets)
+            state = ("MT19937", data["rng_keys"], int(data["rng_pos"]),
+                    int(data["rng_has_gauss"]), float(data["rng_cached"]))
+        before = set(tuple(link) for (group, weight) in original for link in\
+                numpy.asarray(group).tolist())
+        after = set(tuple(link) for (group, weight) in sets for link in\
+                group.tolist())
+        # an attached census is updated along with the restored links
+        if self.census is None:
+            changes = self.graph
+        else:
+            changes = self.census
+        for (src, tar) in before - after:
+            changes.remove_edge(src, tar)
+        for (src, tar) in after - before:
+            changes.add_edge(src, tar)
+        self._prepare(sets)
+        numpy.random.set_state(state)
+        success = self._run(sets, track)
+        return (self.graph, success)
+
+
+class OverlayAdjacency(object):
+    """
+    Successors or predecessors of a node in an `OverlayGraph`.
+    """
+
+    __slots__ = ("base", "added", "removed")
+
+    def __init__(self, base, added, removed):
+        """
+        """
+        self.base = base
+        self.added = added
+        self.removed = removed
+
+    def __contains__(self, other):
+        if other in self.added:
+            return True
+        return other in self.base and other not in self.removed
+
+    def __iter__(self):
+        for other in self.base:
+            if other not in self.removed:
+                yield other
+        for other in self.added:
+            yield other
+
+    def __len__(self):
+        return len(self.base) - len(self.removed) + len(self.added)
+
+
+class OverlayDirection(object):
+    """
+    Maps nodes of an `OverlayGraph` to their successors or predecessors.
+    """
+
+    def __init__(self, base, added, removed):
+        """
+        """
+        object.__init__(self)
+        self.base = base
+        self.added = added
+        self.removed = removed
+
+    def __getitem__(self, node):
+        return OverlayAdjacency(self.base[node], self.added.get(node, ()),
+                self.removed.get(node, ()))
+
+    def __contains__(self, node):
+        return node in self.base
+
+    def __iter__(self):
+        return iter(self.base)
+
+    def __len__(self):
+        return len(self.base)
+
+
+class OverlayGraph(object):
+    """
+    Directed graph that records added and removed links relative to an
+    unchanged template instead of copying it.
+
+    It offers the read interface of a networkx.DiGraph used by the census
+    functions, node and link attributes are those of the template.
+
+    Attributes
+    ----------
+    template: directed graph
+        The underlying graph.
+    succ, pred: OverlayDirection
+        Successors and predecessors of nodes.
+    """
+
+    def __init__(self, template):
+        """
+        """
+        object.__init__(self)
+        if not template.is_directed():
+            raise nx.NetworkXError("not defined for undirected graphs")
+        self.template = template
+        self.name = template.name
+        self.graph = template.graph
+        self.node = template.node
+        # links changed with respect to the template per node
+        self._added_succ = dict()
+        self._removed_succ = dict()
+        self._added_pred = dict()
+        self._removed_pred = dict()
+        self._size = template.size()
+        self.succ = OverlayDirection(template.succ, self._added_succ,
+                self._removed_succ)
+        self.pred = OverlayDirection(template.pred, self._added_pred,
+                self._removed_pred)
+        self.adj = self.succ
+        self._graph = None
+
+    @property
+    def added(self):
+        """
+        Links not in the template.
+        """
+        return set((u, v) for (u, nbrs) in self._added_succ.iteritems() for v\
+                in nbrs)
+
+    @property
+    def removed(self):
+        """
+        Links of the template that are absent.
+        """
+        return set((u, v) for (u, nbrs) in self._removed_succ.iteritems() for\
+                v in nbrs)
+
+    def __getitem__(self, node):
+        return self.succ[node]
+
+    def __contains__(self, node):
+        return node in self.template
+
+    def __iter__(self):
+        return iter(self.template)
+
+    def __len__(self):
+        return len(self.template)
+
+    def is_directed(self):
+        return True
+
+    def is_multigraph(self):
+        return False
+
+    def order(self):
+        return self.template.order()
+
+    number_of_nodes = order
+
+    def nodes_iter(self, data=False):
+        return self.template.nodes_iter(data=data)
+
+    def nodes(self, data=False):
+        return self.template.nodes(data=data)
+
+    def has_edge(self, src, tar):
+        return src in self.template and tar in self.succ[src]
+
+    def _change(self, added, removed, src, tar):
+        if tar in removed.get(src, ()):
+            removed[src].remove(tar)
+            if not removed[src]:
+                del removed[src]
+        else:
+            added.setdefault(src, set()).add(tar)
+
+    def add_edge(self, src, tar):
+        if self.has_edge(src, tar):
+            return
+        self._change(self._added_succ, self._removed_succ, src, tar)
+        self._change(self._added_pred, self._removed_pred, tar, src)
+        self._size += 1
+        self._graph = None
+
+    def remove_edge(self, src, tar):
+        if not self.has_edge(src, tar):
+            raise nx.NetworkXError("the edge %s-%s is not in the graph" %\
+                    (src, tar))
+        self._change(self._removed_succ, self._added_succ, src, tar)
+        self._change(self._removed_pred, self._added_pred, tar, src)
+        self._size -= 1
+        self._graph = None
+
+    def size(self):
+        return self._size
+
+    number_of_edges = size
+
+    def successors_iter(self, node):
+        return iter(self.succ[node])
+
+    def predecessors_iter(self, node):
+        return iter(self.pred[node])
+
+    def successors(self, node):
+        return list(self.succ[node])
+
+    def predecessors(self, node):
+        return list(self.pred[node])
+
+    def out_degree(self, nbunch=None):
+        return self._degree(self.succ, nbunch)
+
+    def in_degree(self, nbunch=None):
+        return self._degree(self.pred, nbunch)
+
+    def _degree(self, direction, nbunch):
+        try:
+            if nbunch in self.template:
+                return len(direction[nbunch])
+        except TypeError:
+            pass
+        if nbunch is None:
+            nbunch = self.template
+        return dict((node, len(direction[node])) for node in nbunch)
+
+    def edges_iter(self, data=False):
+        """
+        Links of the overlay, added ones have no attributes.
+        """
+        template = self.template.succ
+        for (u, nbrs) in self.succ.base.iteritems():
+            removed = self._removed_succ.get(u, ())
+            for v in nbrs:
+                if v not in removed:
+                    if data:
+                        yield (u, v, template[u][v])
                     else:
-                        nx.NetworkXError("unknown category")
-                    total_left -= 1
-                    track[j, 1] -= 1
-                    try:
-                        probs = [float(track[k, 1]) / float(total_left)\
-                                for k in xrange(len_sets)]
-                    except ZeroDivisionError:
-                        pass # end of randomisation
-                    break # selected right category, continue with outer loop
-        return (self.graph, float(track[:, 2].sum()) / float(track[:, 0].sum()))
+                        yield (u, v)
+            for v in self._added_succ.get(u, ()):
+                if data:
+                    yield (u, v, dict())
+                else:
+                    yield (u, v)
+
+    def edges(self, data=False):
+        return list(self.edges_iter(data=data))
+
+    def selfloop_edges(self):
+        return [(u, u) for u in self.template if u in self.succ[u]]
+
+    def number_of_selfloops(self):
+        return len(self.selfloop_edges())
+
+    def materialise(self):
+        """
+        A copy of the template with the recorded changes, it is only built
+        once for the same state of the overlay.
+        """
+        if self._graph is None:
+            graph = self.template.copy()
+            graph.remove_edges_from(self.removed)
+            graph.add_edges_from(self.added)
+            self._graph = graph
+        return self._graph
+
+
+class PackedLinks(object):
+    """
+    Set of directed links between integer nodes stored as packed int64 keys
+    source * num_nodes + target.
+    """
+
+    def __init__(self, num_nodes, src=(), tar=()):
+        """
+        """
+        object.__init__(self)
+        self.num_nodes = num_nodes
+        keys = numpy.asarray(src, dtype=numpy.int64) * num_nodes +\
+                numpy.asarray(tar, dtype=numpy.int64)
+        self.keys = set(keys.tolist())
+
+    def __len__(self):
+        return len(self.keys)
+
+    def has_edge(self, src, tar):
+        return src * self.num_nodes + tar in self.keys
+
+    def add_edge(self, src, tar):
+        self.keys.add(src * self.num_nodes + tar)
+
+    def remove_edge(self, src, tar):
+        self.keys.remove(src * self.num_nodes + tar)
+
+    def edges(self):
+        """
+        Returns
+        -------
+        numpy.ndarray:
+            An (number of links x 2) array of sources and targets.
+        """
+        keys = numpy.fromiter(self.keys, dtype=numpy.int64, count=len(self.keys))
+        keys.sort()
+        return numpy.column_stack((keys // self.num_nodes,
+                keys % self.num_nodes))
+
+
+class UndirectedPackedLinks(PackedLinks):
+    """
+    Set of undirected links stored as packed keys in both directions.
+    """
+
+    def __init__(self, num_nodes, src=(), tar=()):
+        """
+        """
+        src = numpy.asarray(src, dtype=numpy.int64)
+        tar = numpy.asarray(tar, dtype=numpy.int64)
+        PackedLinks.__init__(self, num_nodes, numpy.concatenate((src, tar)),
+                numpy.concatenate((tar, src)))
+
+    def __len__(self):
+        return len(self.keys) // 2
+
+    def add_edge(self, src, tar):
+        self.keys.add(src * self.num_nodes + tar)
+        self.keys.add(tar * self.num_nodes + src)
+
+    def remove_edge(self, src, tar):
+        # links may be removed in both directions when switched like
+        # bidirectional ones
+        self.keys.discard(src * self.num_nodes + tar)
+        self.keys.discard(tar * self.num_nodes + src)
+
+    def edges(self):
+        """
+        Returns
+        -------
+        numpy.ndarray:
+            An (number of links x 2) array of links with the smaller index
+            first.
+        """
+        links = PackedLinks.edges(self)
+        return links[links[:, 0] <= links[:, 1]]
+
+
+def check_packed(links, first, second):
+    """
+    The conditions of `check_standard` for links stored in `PackedLinks`.
+    """
+    if first == second:
+        return False
+    # prevent creation of self-links
+    if first[0] == second[1]:
+        return False
+    if second[0] == first[1]:
+        return False
+    n = links.num_nodes
+    keys = links.keys
+    # check if we would create a parallel edge
+    if first[0] * n + second[1] in keys:
+        return False
+    if second[0] * n + first[1] in keys:
+        return False
+    # check if we would create a bidirectional link
+    # or cover existing reverse link in double link switching
+    if second[1] * n + first[0] in keys:
+        return False
+    if first[1] * n + second[0] in keys:
+        return False
+    return True
+
+
+class ArrayRewiring(NetworkRewiring):
+    """
+    Degree preserving randomisation that switches links on integer arrays.
+
+    Nodes are replaced by indeces, links are kept as packed keys in a hash set
+    for the conditions and as one integer array per group for drawing. A
+    networkx graph is only built once at the end, if at all. The groups are
+    made from the template by `make_groups` as usual while `conditions` and
+    the link changes work on a `PackedLinks` instance that takes the place of
+    `graph` during switching. The `census` attribute is not supported and
+    must be None.
+
+    Attributes
+    ----------
+    nodes: list
+        The nodes of the last template in the order of their indeces.
+    links: PackedLinks
+        The links of the last randomisation.
+
+    Notes
+    -----
+    The template is never modified by `sample`, yielded graphs are new copies.
+    """
+
+    _packing = PackedLinks
+
+    def __init__(self):
+        """
+        """
+        NetworkRewiring.__init__(self)
+        self.conditions = check_packed
+        self.nodes = None
+        self.links = None
+        self._template = None
+        self._original = None
+
+    def randomise(self, template, flip=100, copy=True, as_graph=True):
+        """
+        Randomise a template like `NetworkRewiring.randomise`.
+
+        Parameters
+        ----------
+        template: directed graph
+            The network to randomise, it is not modified unless `copy` is
+            False and a graph is requested.
+        flip: int (optional)
+            Switching attempts per link.
+        copy: bool (optional)
+            Apply the resulting changes to a copy of the template or the
+            template itself.
+        as_graph: bool (optional)
+            Return a graph or only the (number of links x 2) array of node
+            indeces of the randomised links (see `nodes`).
 
+        Returns
+        -------
+        tuple:
+            The randomised graph or link array and the ratio of successful
+            to expected switches.
+        """
+        sets = self._sample_groups(template, copy)
+        success = self._rewire(sets, flip) if sets else 0.0
+        if not as_graph:
+            return (self.links.edges(), success)
+        self.graph = self._materialise(template, copy)
+        return (self.graph, success)
+
+    def resume(self, template, path, copy=True, as_graph=True):
+        """
+        Finish a switching run from a checkpoint like
+        `NetworkRewiring.resume`, the remaining arguments and the result are
+        as for `randomise`.
+        """
+        (links, success) = NetworkRewiring.resume(self, template, path, copy)
+        if not as_graph:
+            return (self.links.edges(), success)
+        self.graph = self._materialise(template, copy)
+        return (self.graph, success)
+
+    def _sample_groups(self, template, copy):
+        """
+        Index the nodes of the template and return its link groups as arrays
+        of indeces.
+        """
+        if template.is_multigraph():
+            raise nx.NetworkXError("not defined for multigraphs")
+        if self.census is not None:
+            raise nx.NetworkXError("a census is not supported on arrays")
+        self.nodes = template.nodes()
+        index = dict((node, i) for (i, node) in enumerate(self.nodes))
+        edges = template.edges()
+        self.links = self._packing(len(self.nodes), [index[u] for (u, v) in\
+                edges], [index[v] for (u, v) in edges])
+        self.graph = self.links
+        self._template = template
+        self._original = set(self.links.keys)
+        sets = list()
+        if edges:
+            for (group, weight) in self.make_groups(template):
+                links = numpy.array([(index[u], index[v]) for (u, v) in group],
+                        dtype=numpy.int64).reshape(-1, 2)
+                sets.append([links, weight])
+        return sets
+
+    def _sample_graph(self):
+        """
+        A new copy of the template with the current links.
+        """
+        return self._materialise(self._template, True)
+
+    def _materialise(self, template, copy):
+        """
+        Apply the difference between the original and the current links to the
+        template or a copy of it.
+        """
+        if copy:
+            graph = template.copy()
+        else:
+            graph = template
+        nodes = self.nodes
+        n = len(nodes)
+        for key in self._original - self.links.keys:
+            graph.remove_edge(nodes[key // n], nodes[key % n])
+        for key in self.links.keys - self._original:
+            graph.add_edge(nodes[key // n], nodes[key % n])
+        return graph
+
+
+class UndirectedRewiring(ArrayRewiring):
+    """
+    Degree preserving randomisation of undirected graphs on integer arrays.
+
+    By default all links form one group in both directions and two links
+    (a, b), (c, d) become either (a, d), (c, b) or (a, c), (b, d). Link arrays
+    returned with `as_graph` False or as snapshots list each link once.
+    """
+
+    _packing = UndirectedPackedLinks
+
+    def __init__(self):
+        """
+        """
+        ArrayRewiring.__init__(self)
+        self.make_groups = standard_undirected_groups
+
+    def _sample_groups(self, template, copy):
+        if template.is_directed():
+            raise nx.NetworkXError("not defined for directed graphs")
+        return ArrayRewiring._sample_groups(self, template, copy)
+
+    def _snapshot(self, sets):
+        # groups switched like bidirectional links hold both directions
+        links = numpy.concatenate([group[group[:, 0] < group[:, 1]] if\
+                weight == 2 else group for (group, weight) in sets] or\
+                [numpy.zeros((0, 2), dtype=numpy.int64)])
+        links.setflags(write=False)
+        return links
+
+    def _materialise(self, template, copy):
+        if copy:
+            graph = template.copy()
+        else:
+            graph = template
+        nodes = self.nodes
+        n = len(nodes)
+        for key in self._original - self.links.keys:
+            if key // n <= key % n:
+                graph.remove_edge(nodes[key // n], nodes[key % n])
+        for key in self.links.keys - self._original:
+            if key // n <= key % n:
+                graph.add_edge(nodes[key // n], nodes[key % n])
+        return graph
+
+
+class BipartiteRewiring(UndirectedRewiring):
+    """
+    Degree preserving randomisation of a `classes.BipartiteGraph`.
+
+    Links only ever connect nodes of different `pop` attribute, so the two
+    populations and their projections stay well defined.
+    """
+
+    def __init__(self):
+        """
+        """
+        UndirectedRewiring.__init__(self)
+        self.make_groups = bipartite_undirected_groups
+
+
+class WeightedRewiring(ArrayRewiring):
+    """
+    Degree preserving randomisation of a weighted directed graph on integer
+    arrays that approximately preserves node strengths.
+
+    Each group has a parallel array of weights. A switched link keeps the
+    weight of the row it replaces, i.e., (a, b, w1) and (c, d, w2) become
+    (a, d, w1) and (c, b, w2), which preserves out-strengths. After each
+    attempt the weights of the two drawn links are swapped if that does not
+    increase the sum of squared differences between the current and original
+    in- and out-strengths.
+
+    Attributes
+    ----------
+    weight: str
+        Edge attribute holding the weights, a missing one counts as 1.
+    swap_weights: bool
+        Whether to perform weight-swap moves.
+    """
+
+    def __init__(self, weight="weight", swap_weights=True):
+        """
+        """
+        ArrayRewiring.__init__(self)
+        self.weight = weight
+        self.swap_weights = swap_weights
+        # weights of the links in a group keyed by group id
+        self._weights = dict()
+        self._sets = list()
+        # current minus original out- and in-strengths
+        self._out_diff = None
+        self._in_diff = None
+
+    def randomise(self, template, flip=100, copy=True, as_graph=True):
+        """
+        Randomise a template like `ArrayRewiring.randomise` but with
+        `as_graph` False return a tuple of the (number of links x 2) array of
+        node indeces and an array of the corresponding weights.
+        """
+        (result, success) = ArrayRewiring.randomise(self, template, flip, copy,
+                as_graph)
+        if as_graph:
+            return (result, success)
+        return (self._weighted_links(), success)
+
+    def _sample_groups(self, template, copy):
+        sets = ArrayRewiring._sample_groups(self, template, copy)
+        nodes = self.nodes
+        adj = template.adj
+        self._weights = dict()
+        for (group, category) in sets:
+            self._weights[id(group)] = numpy.array([adj[nodes[u]][nodes[v]].get(
+                    self.weight, 1.0) for (u, v) in group.tolist()], dtype=float)
+        self._sets = sets
+        self._out_diff = numpy.zeros(len(nodes), dtype=float)
+        self._in_diff = numpy.zeros(len(nodes), dtype=float)
+        return sets
+
+    def _prepare(self, sets):
+        ArrayRewiring._prepare(self, sets)
+        self._sets = sets
+
+    def _weighted_links(self):
+        """
+        Links of all groups and their weights.
+        """
+        if not self._sets:
+            return (numpy.zeros((0, 2), dtype=numpy.int64), numpy.zeros(0))
+        return (numpy.concatenate([group for (group, category) in self._sets]),
+                numpy.concatenate([self._weights[id(group)] for (group,
+                category) in self._sets]))
+
+    def _snapshot(self, sets):
+        (links, weights) = self._weighted_links()
+        links.setflags(write=False)
+        weights.setflags(write=False)
+        return (links, weights)
+
+    def _materialise(self, template, copy):
+        graph = ArrayRewiring._materialise(self, template, copy)
+        nodes = self.nodes
+        for (group, category) in self._sets:
+            for ((u, v), weight) in zip(group.tolist(),
+                    self._weights[id(group)].tolist()):
+                graph[nodes[u]][nodes[v]][self.weight] = weight
+        return graph
+
+    def _checkpoint_arrays(self, sets):
+        arrays = dict(("link_weights%d" % i, self._weights[id(group)]) for\
+                (i, (group, category)) in enumerate(sets))
+        arrays["out_diff"] = self._out_diff
+        arrays["in_diff"] = self._in_diff
+        return arrays
+
+    def _restore_arrays(self, data, sets):
+        self._weights = dict((id(group), data["link_weights%d" % i]) for\
+                (i, (group, category)) in enumerate(sets))
+        self._out_diff = data["out_diff"]
+        self._in_diff = data["in_diff"]
+
+    def _add_edge(self, src, tar, bunch, i):
+        weight = self._weights[id(bunch)][i]
+        self._out_diff[bunch[i, 0]] -= weight
+        self._in_diff[bunch[i, 1]] -= weight
+        self._out_diff[src] += weight
+        self._in_diff[tar] += weight
+        ArrayRewiring._add_edge(self, src, tar, bunch, i)
+
+    def _swap_weights(self, group, u, v):
+        """
+        Exchange the weights of links in rows u and v unless that increases
+        the squared deviation from the original strengths.
+        """
+        weights = self._weights[id(group)]
+        diff = weights[v] - weights[u]
+        if diff == 0.0:
+            return
+        (a, b) = group[u].tolist()
+        (c, d) = group[v].tolist()
+        # change of the squared deviations when the strength of a (b)
+        # increases and that of c (d) decreases by diff
+        change = 0.0
+        if a != c:
+            change += 2.0 * diff * (self._out_diff[a] - self._out_diff[c] +\
+                    diff)
+        if b != d:
+            change += 2.0 * diff * (self._in_diff[b] - self._in_diff[d] +\
+                    diff)
+        if change > 0.0:
+            return
+        (weights[u], weights[v]) = (weights[v], weights[u])
+        self._out_diff[a] += diff
+        self._out_diff[c] -= diff
+        self._in_diff[b] += diff
+        self._in_diff[d] -= diff
+
+    def _switch_single(self, first, second, group, u, v):
+        done = ArrayRewiring._switch_single(self, first, second, group, u, v)
+        if self.swap_weights:
+            self._swap_weights(group, u, v)
+        return done
+
+    def _switch_double(self, first, second, group, u, v):
+        done = ArrayRewiring._switch_double(self, first, second, group, u, v)
+        if self.swap_weights:
+            self._swap_weights(group, u, v)
+        return done
@@ -18,7 +18,13 @@ Subgraph Statistics
 """
 
 
+import os
+import time
+import json
+import hashlib
 import itertools
+import collections
+import multiprocessing
 import numpy
 import networkx as nx
 
@@ -39,18 +45,164 @@ num2tricode = {1: "021D", 2: "021U", 3: "021C", 4: "111D", 5: "111U", 7: "030T",
         8: "030C", 6: "201", 9: "120D", 10: "120U", 11: "120C",
         12: "210", 13: "300"}
 
+# node pairs of a four-node subgraph, the link from the first to the second
+# node is bit 2 * k of the 12-bit adjacency code and the reverse bit 2 * k + 1
+sz4_pairs = ((0, 1), (0, 2), (0, 3), (1, 2), (1, 3), (2, 3))
+
+def _size4_classes():
+    """
+    Maps every 12-bit adjacency code to the mfinder id of its class, i.e., the
+    smallest adjacency matrix (read as a 16-bit number with entry (i, j) at
+    bit 15 - (4 * i + j)) over all node permutations, or to zero if the
+    subgraph is disconnected.
+    """
+    code2id = [-1] * 4096
+    classes = list()
+    for code in xrange(4096):
+        if code2id[code] >= 0:
+            continue
+        links = [pair for (k, pair) in enumerate(sz4_pairs) if code & (1 << (2 *
+                k))] + [pair[::-1] for (k, pair) in enumerate(sz4_pairs) if code &
+                (1 << (2 * k + 1))]
+        # determine connectivity by joining components
+        comp = range(4)
+        for (i, j) in links:
+            (a, b) = (comp[i], comp[j])
+            comp = [a if c == b else c for c in comp]
+        connected = len(set(comp)) == 1
+        orbit = set()
+        mfinder = 1 << 16
+        for perm in itertools.permutations(range(4)):
+            image = 0
+            matrix = 0
+            for (i, j) in links:
+                (p, q) = (perm[i], perm[j])
+                if p < q:
+                    image |= 1 << (2 * sz4_pairs.index((p, q)))
+                else:
+                    image |= 1 << (2 * sz4_pairs.index((q, p)) + 1)
+                matrix |= 1 << (15 - (4 * p + q))
+            orbit.add(image)
+            mfinder = min(mfinder, matrix)
+        if not connected:
+            mfinder = 0
+        else:
+            classes.append(mfinder)
+        for image in orbit:
+            code2id[image] = mfinder
+    classes.sort()
+    id2num = dict((mtf, i + 1) for (i, mtf) in enumerate(classes))
+    num2id = dict((i + 1, mtf) for (i, mtf) in enumerate(classes))
+    return (code2id, id2num, num2id)
+
+(sz4_code2id, mtf_sz4_id2num, mtf_sz4_num2id) = _size4_classes()
+
 
 def compute_triad_zscores(network, census="mtf_counts", randoms="randoms",
         mapping=num2tricode):
-    zscores = numpy.zeros(13)
-    for mtf_num in xrange(1, 14):
+    """
+    Z-scores of the motifs in `mapping` ordered by their number, e.g.,
+    `mtf_sz4_num2id` for the census of `tetradic_census`.
+    """
+    zscores = numpy.zeros(len(mapping))
+    for (i, mtf_num) in enumerate(sorted(mapping)):
         mtf = mapping[mtf_num]
-        zscores[mtf_num - 1] = stats.compute_zscore(
+        zscores[i] = stats.compute_zscore(
                 network.graph[census].get(mtf, 0.0),
                 [rnd.graph[census].get(mtf, 0.0) for rnd in\
                     network.graph[randoms]])
     return zscores
 
+def ensemble_triadic_census(randoms, m=None, count_disconnected=False,
+        size=None):
+    """
+    Computes the triadic census of each graph in an ensemble.
+
+    Graphs are consumed one at a time, so `randoms` can be a generator that
+    randomises a template on demand and no graph needs to be retained.
+
+    Parameters
+    ----------
+    randoms: iterable
+        Directed graphs whose interface should resemble a ``networkx.DiGraph``
+        or `CompressedDiGraph` snapshots.
+    m: dict (optional)
+        A map between nodes in the graphs and contiguous indeces from 0 to
+        (number of nodes) - 1.
+    count_disconnected: bool (optional)
+        Determines whether the unconnected triads should be counted as well,
+        otherwise their columns are zero.
+    size: int (optional)
+        Number of graphs in the ensemble, taken from `len(randoms)` if
+        possible. The array grows as needed otherwise.
+
+    Returns
+    -------
+    numpy.ndarray:
+        An (ensemble size x 16) integer array, one row per graph with columns
+        ordered as `triad_names`.
+    """
+    if size is None:
+        try:
+            size = len(randoms)
+        except TypeError:
+            size = 64
+    table = numpy.zeros((size, 16), dtype=numpy.int64)
+    i = -1
+    for (i, rnd) in enumerate(randoms):
+        if not isinstance(rnd, CompressedDiGraph):
+            rnd = CompressedDiGraph(rnd, m=m)
+        n = rnd.num_nodes
+        counts = _compressed_count(rnd.nbr_ptr.tolist(), rnd.nbr_idx.tolist(),
+                rnd.nbr_dir.tolist(), 0, n, n, count_disconnected)
+        if count_disconnected:
+            counts[0] = ((n * (n - 1) * (n - 2)) / 6) - sum(counts[1:])
+        if i == len(table):
+            table = numpy.concatenate((table, numpy.zeros((max(len(table),
+                    1), 16), dtype=table.dtype)))
+        table[i] = counts
+    return table[:i + 1]
+
+def ensemble_triad_zscores(census, table, mapping=num2tricode):
+    """
+    Z-scores of all motifs at once from an ensemble census.
+
+    Parameters
+    ----------
+    census: dict or array-like
+        Census of the original network, either a dictionary with triad names as
+        keys or 16 counts ordered as `triad_names`.
+    table: numpy.ndarray
+        Census of the random networks as returned by
+        `ensemble_triadic_census`.
+    mapping: dict (optional)
+        Motif numbers and names, the result is ordered by number as in
+        `compute_triad_zscores`.
+
+    Returns
+    -------
+    numpy.ndarray:
+        The z-scores, which are 0.0 for an observation equal to the ensemble
+        mean and infinite for a differing observation and zero variance.
+    """
+    columns = [triad_names.index(mapping[num]) for num in sorted(mapping)]
+    if isinstance(census, dict):
+        obs = numpy.array([census.get(mapping[num], 0.0) for num in\
+                sorted(mapping)], dtype=float)
+    else:
+        obs = numpy.asarray(census, dtype=float)[columns]
+    table = numpy.asarray(table, dtype=float)[:, columns]
+    if len(table) == 0:
+        return numpy.repeat(numpy.nan, len(columns))
+    nominator = obs - table.mean(axis=0)
+    std = table.std(axis=0)
+    zscores = numpy.zeros(len(columns))
+    spread = (std != 0.0)
+    zscores[spread] = nominator[spread] / std[spread]
+    fixed = ~spread & (nominator != 0.0)
+    zscores[fixed] = numpy.copysign(numpy.inf, nominator[fixed])
+    return zscores
+
 def generate_random_ensemble(args):
     template = args[0]
     i = args[1]
@@ -60,10 +212,95 @@ def generate_random_ensemble(args):
         switches = 100
     rewire = net_rnd.NetworkRewiring()
     (rnd, success) = rewire.randomise(template, flip=switches)
-    rnd.graph["mtf_counts"] = triadic_census(rnd)
+    rnd.graph["mtf_counts"] = triadic_census(CompressedDiGraph(rnd))
     print "randomised network", i, "switching success", success
     return rnd
 
+def census_statistic(graph):
+    """
+    The connected triad counts of a graph as 16 integers ordered as
+    `triad_names`, a compact statistic for `iter_random_ensemble`.
+    """
+    csr = CompressedDiGraph(graph)
+    n = csr.num_nodes
+    return numpy.array(_compressed_count(csr.nbr_ptr.tolist(),
+            csr.nbr_idx.tolist(), csr.nbr_dir.tolist(), 0, n, n, False),
+            dtype=numpy.int64)
+
+def _init_ensemble_worker(template, rewiring, statistic, flip, seed):
+    _shared["ensemble"] = (template, rewiring, statistic, flip, seed)
+
+def _ensemble_member(i):
+    return _random_member(*(_shared["ensemble"] + (i,)))
+
+def _random_member(template, rewiring, statistic, flip, seed, i):
+    # an independent stream per member regardless of the worker running it
+    numpy.random.seed([seed, i])
+    (rnd, success) = rewiring.randomise(template, flip=flip)
+    return (i, statistic(rnd), success)
+
+def iter_random_ensemble(template, num, flip=100, seed=None, n_jobs=None,
+        statistic=census_statistic, rewiring=None):
+    """
+    Generates an ensemble of randomised networks in parallel and yields only a
+    statistic of each member as soon as it is available.
+
+    The template is sent to every worker process once and member i always
+    uses a random number stream seeded with (seed, i), so an ensemble can be
+    reproduced independent of the number of processes and order of
+    completion.
+
+    Parameters
+    ----------
+    template: directed graph
+        The network to randomise.
+    num: int
+        Number of ensemble members.
+    flip: int (optional)
+        Switching attempts per link, see `NetworkRewiring.randomise`.
+    seed: int (optional)
+        Master seed of the ensemble, drawn at random if not given.
+    n_jobs: int (optional)
+        Number of worker processes, `None` uses all available CPUs and 1 runs
+        in the current process without changing its random state.
+    statistic: callable (optional)
+        Function of a randomised graph whose (picklable) result is returned,
+        by default the connected triad counts.
+    rewiring: NetworkRewiring (optional)
+        A configured rewiring object, by default the standard setup.
+
+    Returns
+    -------
+    iterator:
+        Tuples of member index, statistic and switching success in order of
+        completion.
+    """
+    if seed is None:
+        seed = numpy.random.randint(2**31 - 1)
+    if rewiring is None:
+        rewiring = net_rnd.NetworkRewiring()
+    args = (template, rewiring, statistic, flip, seed)
+    if n_jobs is None:
+        n_jobs = multiprocessing.cpu_count()
+    if n_jobs == 1:
+        # leave the random state of the calling process as it was
+        for i in xrange(num):
+            state = numpy.random.get_state()
+            try:
+                result = _random_member(*(args + (i,)))
+            finally:
+                numpy.random.set_state(state)
+            yield result
+        return
+    pool = multiprocessing.Pool(n_jobs, initializer=_init_ensemble_worker,
+            initargs=args)
+    try:
+        for result in pool.imap_unordered(_ensemble_member, xrange(num)):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
 
 ################################################################################
 #    (C) Reya Group: http://www.reyagroup.com
@@ -81,7 +318,8 @@ tricodes = (1, 2, 2, 3, 2, 4, 6, 8, 2, 6, 5, 7, 3, 8, 7, 11, 2, 6, 4, 8, 5, 9,
 tricode_to_name = dict((i, triad_names[tricodes[i] - 1])\
         for i in range(len(tricodes))) # for Python 3.x compatibility
 
-def triadic_census(graph, m=None, count_disconnected=False, record_triads=False):
+def triadic_census(graph, m=None, count_disconnected=False, record_triads=False,
+        n_jobs=1, sink=None, cache=None):
     """
     Counts all directed triads (three-node subgraphs).
 
@@ -93,7 +331,8 @@ def triadic_census(graph, m=None, count_disconnected=False, record_triads=False)
     graph : directed graph
         A directed graph whose nodes are integers from 0 to (number of nodes) -
         1, unless a mapping between nodes and indeces is provided. graph can be,
-        for example, a networkx.DiGraph.
+        for example, a networkx.DiGraph. If it is a `CompressedDiGraph` the
+        array-backed census is used instead.
     m: dict (optional)
         A map between nodes in the graph graph and their indeces.
     count_disconnected: bool (optional)
@@ -101,6 +340,17 @@ def triadic_census(graph, m=None, count_disconnected=False, record_triads=False)
     record_triads: bool (optional)
         Determines whether node-triples making up one triad should be recorded
         in a separate dictionary.
+    n_jobs: int (optional)
+        Number of worker processes, `None` uses all available CPUs. More than
+        one job always uses the array-backed census.
+    sink: TriadSink (optional)
+        Streams the node-triples making up each triad in chunks instead of
+        recording them in memory, using the array-backed census. Triples are
+        indeces into the node order, i.e., as given by `m` or sorted.
+    cache: CensusCache (optional)
+        Look up the census of a graph with identical links before counting and
+        store it afterwards, using the array-backed census. Not used when
+        triads are recorded.
 
     Returns
     -------
@@ -226,6 +476,21 @@ def triadic_census(graph, m=None, count_disconnected=False, record_triads=False)
                         if record_triads:
                             record[tricode_to_name[code]].append((v, u, w))
 
+    if (n_jobs != 1 or sink is not None or cache is not None) and\
+            not isinstance(graph, CompressedDiGraph):
+        graph = CompressedDiGraph(graph, m=m)
+    if cache is not None and not record_triads and sink is None:
+        key = cache.fingerprint(graph, count_disconnected)
+        census = cache.get(key)
+        if census is None:
+            census = compressed_triadic_census(graph,
+                    count_disconnected=count_disconnected, n_jobs=n_jobs)
+            cache.put(key, census)
+        return dict(census)
+    if isinstance(graph, CompressedDiGraph):
+        return compressed_triadic_census(graph,
+                count_disconnected=count_disconnected,
+                record_triads=record_triads, n_jobs=n_jobs, sink=sink)
     if not graph.is_directed():
         raise nx.NetworkXError("not defined for undirected graphs")
 
@@ -264,27 +529,1458 @@ def triadic_census(graph, m=None, count_disconnected=False, record_triads=False)
 
 ################################################################################
 
-if __name__ == "__main__":
-    import timeit
-    G = nx.read_edgelist("random_graph.edgelist", create_using=nx.DiGraph(),
-            nodetype=int)
-    mapping = dict(itertools.izip(G.nodes_iter(), itertools.count()))
-    t2 = timeit.Timer(stmt="triadic_census(G)",
-            setup="from __main__ import triadic_census;from __main__ import G")
-    t3 = timeit.Timer(stmt="triadic_census(G, count_disconnected=True)",
-            setup="from __main__ import triadic_census;from __main__ import G")
-    t4 = timeit.Timer(stmt="triadic_census(G, m=mapping)",
-            setup="from __main__ import triadic_census;from __main__ import G;"\
-            "from __main__ import mapping")
-    t5 = timeit.Timer(stmt="triadic_census(G, m=mapping, count_disconnected=True)",
-            setup="from __main__ import triadic_census;from __main__ import G;"\
-            "from __main__ import mapping")
-    times2 = t2.repeat(repeat=30, number=5)
-    times3 = t3.repeat(repeat=30, number=5)
-    times4 = t4.repeat(repeat=30, number=5)
-    times5 = t5.repeat(repeat=30, number=5)
-    print "default census time mean", numpy.mean(times2), "+/-", numpy.std(times2)
-    print "with disconnected census time mean", numpy.mean(times3), "+/-", numpy.std(times3)
-    print "using mapping census time mean", numpy.mean(times4), "+/-", numpy.std(times4)
-    print "with disconnected using mapping census time mean", numpy.mean(times5), "+/-", numpy.std(times5)
 
+class CompressedDiGraph(object):
+    """
+    Compressed sparse row (CSR) snapshot of a directed graph.
+
+    Nodes are replaced by contiguous integer indeces that respect the node
+    order used by `triadic_census`, i.e., the given mapping `m` or otherwise
+    the sorted order of the nodes themselves. Self-links are dropped since they
+    do not contribute to any triad.
+
+    Attributes
+    ----------
+    nodes: list
+        The original nodes in the order of their indeces.
+    out_ptr, out_idx: numpy.ndarray
+        Row pointers and sorted indeces of successors.
+    in_ptr, in_idx: numpy.ndarray
+        Row pointers and sorted indeces of predecessors.
+    nbr_ptr, nbr_idx, nbr_dir: numpy.ndarray
+        Row pointers and sorted indeces of all neighbours with the direction of
+        the link encoded as 1 (outgoing), 2 (incoming), or 3 (both).
+    weights: numpy.ndarray or None
+        Link weights aligned with `out_idx`, if requested.
+    """
+
+    def __init__(self, graph, m=None, weight=None):
+        """
+        Parameters
+        ----------
+        graph: directed graph
+            A graph whose interface should resemble a ``networkx.DiGraph``.
+        m: dict (optional)
+            A map between nodes in the graph and contiguous indeces from 0 to
+            (number of nodes) - 1.
+        weight: str (optional)
+            Link attribute whose values (default 1.0) are stored in `weights`.
+        """
+        object.__init__(self)
+        if not graph.is_directed():
+            raise nx.NetworkXError("not defined for undirected graphs")
+        if m:
+            self.nodes = sorted(graph.nodes_iter(), key=m.get)
+        else:
+            self.nodes = sorted(graph.nodes_iter())
+            m = dict(itertools.izip(self.nodes, itertools.count()))
+        num_edges = graph.size()
+        src = numpy.fromiter((m[u] for (u, v) in graph.edges_iter()),
+                dtype=numpy.int64, count=num_edges)
+        tar = numpy.fromiter((m[v] for (u, v) in graph.edges_iter()),
+                dtype=numpy.int64, count=num_edges)
+        if weight is None:
+            weights = None
+        else:
+            weights = numpy.fromiter((data.get(weight, 1.0) for (u, v, data)\
+                    in graph.edges_iter(data=True)), dtype=float,
+                    count=num_edges)
+        self._setup(len(self.nodes), src, tar, weights)
+
+    @classmethod
+    def from_edges(cls, num_nodes, src, tar, nodes=None, weights=None):
+        """
+        Build a snapshot directly from integer edge arrays.
+
+        Parameters
+        ----------
+        num_nodes: int
+            Number of nodes, all indeces in `src` and `tar` must be smaller.
+        src, tar: array-like
+            Sources and targets of the directed links.
+        nodes: list (optional)
+            The original nodes in the order of their indeces.
+        weights: array-like (optional)
+            Weights of the links in the same order as `src` and `tar`.
+        """
+        csr = cls.__new__(cls)
+        if nodes is None:
+            nodes = range(num_nodes)
+        csr.nodes = list(nodes)
+        if weights is not None:
+            weights = numpy.asarray(weights, dtype=float)
+        csr._setup(num_nodes, numpy.asarray(src, dtype=numpy.int64),
+                numpy.asarray(tar, dtype=numpy.int64), weights)
+        return csr
+
+    def _setup(self, num_nodes, src, tar, weights=None):
+        self.num_nodes = num_nodes
+        mask = (src != tar)
+        src = src[mask]
+        tar = tar[mask]
+        (self.out_ptr, self.out_idx, order) = _compress(num_nodes, src, tar)
+        (self.in_ptr, self.in_idx, _) = _compress(num_nodes, tar, src)
+        if weights is None:
+            self.weights = None
+        else:
+            self.weights = weights[mask][order]
+        # merge both directions, links present in both become direction 3
+        rows = numpy.concatenate((src, tar))
+        cols = numpy.concatenate((tar, src))
+        dirs = numpy.concatenate((numpy.ones(len(src), dtype=numpy.int8),
+                numpy.repeat(numpy.int8(2), len(tar))))
+        keys = rows * num_nodes + cols
+        order = numpy.argsort(keys, kind="mergesort")
+        keys = keys[order]
+        dirs = dirs[order]
+        if len(keys):
+            first = numpy.concatenate(([True], keys[1:] != keys[:-1]))
+            starts = numpy.nonzero(first)[0]
+            self.nbr_dir = numpy.bitwise_or.reduceat(dirs, starts)
+            keys = keys[starts]
+        else:
+            self.nbr_dir = dirs
+        self.nbr_ptr = numpy.zeros(num_nodes + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(keys // num_nodes, minlength=num_nodes),
+                out=self.nbr_ptr[1:])
+        self.nbr_idx = keys % num_nodes if num_nodes else keys
+
+    def number_of_nodes(self):
+        return self.num_nodes
+
+    def number_of_edges(self):
+        return len(self.out_idx)
+
+    def degree(self):
+        """
+        Number of distinct neighbours of each node.
+        """
+        return numpy.diff(self.nbr_ptr)
+
+
+def _compress(num_nodes, rows, cols):
+    """
+    Sort links by row and column and return CSR row pointers, columns and the
+    sorting order.
+    """
+    order = numpy.lexsort((cols, rows))
+    ptr = numpy.zeros(num_nodes + 1, dtype=numpy.int64)
+    numpy.cumsum(numpy.bincount(rows, minlength=num_nodes), out=ptr[1:])
+    return (ptr, cols[order], order)
+
+def _merge_neighbours(v, u, link, v_idx, v_dirs, j, v_stop, u_idx, u_dirs, k,
+        u_stop, every=False):
+    """
+    Merge the sorted neighbour rows of the connected dyad (v, u).
+
+    The row of v is [j, v_stop) of `v_idx` and `v_dirs`, that of u is
+    [k, u_stop) of `u_idx` and `u_dirs`, with `link` the direction of (v, u).
+    The triad code is assembled from the link directions stored alongside.
+    Returns a list of (w, code) pairs, where code indexes `tricodes`, and the
+    number of third nodes w adjacent to v or u. Unless `every` is set, only
+    the triads (v, u, w) that Batagelj and Mrvar's algorithm counts at this
+    dyad are listed.
+    """
+    triads = list()
+    size = 0
+    while j < v_stop or k < u_stop:
+        if k == u_stop or (j < v_stop and v_idx[j] < u_idx[k]):
+            # w is only a neighbour of v
+            w = v_idx[j]
+            code = link + (v_dirs[j] << 2)
+            j += 1
+            if w == u:
+                continue
+            size += 1
+            if w < u and not every:
+                continue
+        elif j == v_stop or u_idx[k] < v_idx[j]:
+            # w is only a neighbour of u
+            w = u_idx[k]
+            code = link + (u_dirs[k] << 4)
+            k += 1
+            if w == v:
+                continue
+            size += 1
+            if w < v and not every:
+                continue
+        else:
+            # w is a neighbour of both
+            w = v_idx[j]
+            code = link + (v_dirs[j] << 2) + (u_dirs[k] << 4)
+            j += 1
+            k += 1
+            size += 1
+            if w < u and not every:
+                continue
+        triads.append((w, code))
+    return (triads, size)
+
+def _compressed_count(ptr, idx, dirs, begin, end, n, count_disconnected,
+        record=None, sink=None, profile=None):
+    """
+    Batagelj and Mrvar's census over CSR lists for the nodes v in [begin, end).
+
+    Instead of set unions the sorted neighbours of v and u are merged by
+    `_merge_neighbours`, so no membership tests are needed. Returns a list of counts ordered as
+    `triad_names`; `record`, if given, is a list of 16 lists that receives
+    index triples and is handed to `sink` after each node v. `profile`, if
+    given, is a flat list of 16 counts per node that receives the
+    participation of each node in the triads.
+    """
+    codes = [c - 1 for c in tricodes]
+    counts = [0] * 16
+    for v in xrange(begin, end):
+        v_start = ptr[v]
+        v_stop = ptr[v + 1]
+        for i in xrange(v_start, v_stop):
+            u = idx[i]
+            if u <= v:
+                continue
+            link = dirs[i]
+            (triads, size) = _merge_neighbours(v, u, link, idx, dirs, v_start,
+                    v_stop, idx, dirs, ptr[u], ptr[u + 1])
+            for (w, code) in triads:
+                code = codes[code]
+                counts[code] += 1
+                if record is not None:
+                    record[code].append((v, u, w))
+                if profile is not None:
+                    profile[16 * v + code] += 1
+                    profile[16 * u + code] += 1
+                    profile[16 * w + code] += 1
+            # calculate dyadic triads instead of counting them
+            if count_disconnected:
+                if link == 3:
+                    counts[2] += n - size - 2
+                else:
+                    counts[1] += n - size - 2
+        if sink is not None:
+            sink.collect()
+    return counts
+
+def _shard_nodes(csr, num_shards):
+    """
+    Split the node range into contiguous shards of about equal work.
+
+    The work for a node v is the degree mass of all dyads (v, u) with u > v
+    that it owns, i.e., the summed lengths of the neighbour lists to merge.
+    """
+    n = csr.num_nodes
+    degree = csr.degree()
+    rows = numpy.repeat(numpy.arange(n), degree)
+    owned = csr.nbr_idx > rows
+    work = numpy.bincount(rows[owned], weights=(degree[rows[owned]] +
+            degree[csr.nbr_idx[owned]]), minlength=n)
+    mass = numpy.cumsum(work)
+    total = mass[-1] if n else 0.0
+    bounds = numpy.searchsorted(mass, numpy.linspace(0.0, total,
+            num_shards + 1)[1:-1], side="right")
+    bounds = numpy.unique(numpy.concatenate(([0], bounds, [n])))
+    return zip(bounds[:-1].tolist(), bounds[1:].tolist())
+
+_shared = dict()
+
+def _init_census_worker(ptr, idx, dirs, n, count_disconnected, record_triads,
+        profile=False):
+    _shared["args"] = (ptr, idx, dirs)
+    _shared["n"] = n
+    _shared["count_disconnected"] = count_disconnected
+    _shared["record_triads"] = record_triads
+    _shared["profile"] = profile
+
+def _census_shard(bounds):
+    if _shared["record_triads"]:
+        record = [list() for name in triad_names]
+    else:
+        record = None
+    if _shared["profile"]:
+        profile = [0] * (16 * _shared["n"])
+    else:
+        profile = None
+    counts = _compressed_count(*(_shared["args"] + bounds + (_shared["n"],
+            _shared["count_disconnected"], record, None, profile)))
+    if profile is not None:
+        profile = numpy.array(profile, dtype=numpy.int64)
+    return (counts, record, profile)
+
+def _census_from_counts(counts, n, count_disconnected):
+    if count_disconnected:
+        counts = list(counts)
+        # null triads = total number of possible triads - all found triads
+        counts[0] = ((n * (n - 1) * (n - 2)) / 6) - sum(counts[1:])
+        return dict(itertools.izip(triad_names, counts))
+    else:
+        return dict(itertools.izip(triad_names[3:], counts[3:]))
+
+def compressed_triadic_census(csr, count_disconnected=False,
+        record_triads=False, n_jobs=1, sink=None):
+    """
+    Counts all directed triads of a `CompressedDiGraph`.
+
+    The result is identical to that of `triadic_census` on the graph the
+    snapshot was taken of, but the computation runs on plain integer arrays.
+
+    Parameters
+    ----------
+    csr: CompressedDiGraph
+        Snapshot of a directed graph.
+    count_disconnected: bool (optional)
+        Determines whether the unconnected triads should be counted as well.
+    record_triads: bool (optional)
+        Determines whether node-triples making up one triad should be recorded
+        in a separate dictionary.
+    n_jobs: int (optional)
+        Number of worker processes, `None` uses all available CPUs. Each
+        process counts the triads owned by a shard of the nodes and the
+        partial results are summed up.
+    sink: TriadSink (optional)
+        Receives the recorded node-triples in chunks as index triples into
+        `csr.nodes` instead of collecting them in memory. Implies recording
+        but only the census is returned.
+
+    Returns
+    -------
+    dict:
+        Dictionary with triad names as keys and number of occurances as values.
+    dict (optional):
+        Dictionary with triad names as keys and lists with node triples as
+        values.
+    """
+    n = csr.num_nodes
+    args = (csr.nbr_ptr.tolist(), csr.nbr_idx.tolist(), csr.nbr_dir.tolist())
+    if sink is not None:
+        record_triads = False
+    if n_jobs is None:
+        n_jobs = multiprocessing.cpu_count()
+    if n_jobs > 1 and n > 0:
+        pool = multiprocessing.Pool(n_jobs, initializer=_init_census_worker,
+                initargs=args + (n, count_disconnected, record_triads or\
+                sink is not None))
+        try:
+            if sink is None:
+                results = pool.map(_census_shard, _shard_nodes(csr, n_jobs))
+            else:
+                # smaller shards bound the memory held by the triad records
+                results = list()
+                for (part, record, profile) in pool.imap_unordered(
+                        _census_shard,
+                        _shard_nodes(csr, 16 * n_jobs)):
+                    sink.extend(record)
+                    results.append((part, None))
+        finally:
+            pool.close()
+            pool.join()
+        counts = [sum(res[0][i] for res in results) for i in xrange(16)]
+        if record_triads:
+            record = [list(itertools.chain.from_iterable(res[1][i] for res\
+                    in results)) for i in xrange(16)]
+    else:
+        if sink is not None:
+            record = sink.record
+        elif record_triads:
+            record = [list() for name in triad_names]
+        else:
+            record = None
+        counts = _compressed_count(*(args + (0, n, n, count_disconnected,
+                record, sink)))
+    census = _census_from_counts(counts, n, count_disconnected)
+    if sink is not None:
+        sink.collect(force=True)
+    if not record_triads:
+        return census
+    nodes = csr.nodes
+    triads = dict()
+    for (i, name) in enumerate(triad_names):
+        if name in census:
+            triads[name] = [(nodes[v], nodes[u], nodes[w]) for (v, u, w) in\
+                    record[i]]
+    return (census, triads)
+
+def triad_participation(graph, m=None, n_jobs=1):
+    """
+    Counts how often each node takes part in each type of connected triad.
+
+    Parameters
+    ----------
+    graph : directed graph
+        A graph whose interface should resemble a ``networkx.DiGraph`` or a
+        `CompressedDiGraph`.
+    m: dict (optional)
+        A map between nodes in the graph and contiguous indeces from 0 to
+        (number of nodes) - 1.
+    n_jobs: int (optional)
+        Number of worker processes, `None` uses all available CPUs.
+
+    Returns
+    -------
+    dict:
+        Dictionary with triad names as keys and number of occurances as values.
+    numpy.ndarray:
+        An (number of nodes x 16) integer array whose rows follow the node
+        indeces and whose columns follow `triad_names`. The columns of the
+        three unconnected triad types are zero.
+    """
+    if isinstance(graph, CompressedDiGraph):
+        csr = graph
+    else:
+        csr = CompressedDiGraph(graph, m=m)
+    n = csr.num_nodes
+    args = (csr.nbr_ptr.tolist(), csr.nbr_idx.tolist(), csr.nbr_dir.tolist())
+    if n_jobs is None:
+        n_jobs = multiprocessing.cpu_count()
+    if n_jobs > 1 and n > 0:
+        pool = multiprocessing.Pool(n_jobs, initializer=_init_census_worker,
+                initargs=args + (n, False, False, True))
+        try:
+            profile = numpy.zeros(16 * n, dtype=numpy.int64)
+            counts = [0] * 16
+            for (part, record, partial) in pool.imap_unordered(_census_shard,
+                    _shard_nodes(csr, n_jobs)):
+                profile += partial
+                counts = [a + b for (a, b) in itertools.izip(counts, part)]
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        profile = [0] * (16 * n)
+        counts = _compressed_count(*(args + (0, n, n, False, None, None,
+                profile)))
+        profile = numpy.array(profile, dtype=numpy.int64)
+    return (_census_from_counts(counts, n, False), profile.reshape(n, 16))
+
+def tetradic_census(graph, m=None):
+    """
+    Counts all connected directed four-node subgraphs.
+
+    Every connected node set of size four is enumerated exactly once with
+    Wernicke's ESU algorithm on the sorted neighbour arrays and its class is
+    looked up from the 12-bit adjacency code in `sz4_code2id`.
+
+    Parameters
+    ----------
+    graph : directed graph
+        A graph whose interface should resemble a ``networkx.DiGraph`` or a
+        `CompressedDiGraph`.
+    m: dict (optional)
+        A map between nodes in the graph and contiguous indeces from 0 to
+        (number of nodes) - 1.
+
+    Returns
+    -------
+    dict:
+        Dictionary with the mfinder ids of the 199 classes (see
+        `mtf_sz4_id2num`) as keys and number of occurances as values.
+
+    References
+    ----------
+    .. [1] S. Wernicke, Efficient detection of network motifs, IEEE/ACM
+        Transactions on Computational Biology and Bioinformatics, 3:347-359
+        (2006)
+    """
+    if isinstance(graph, CompressedDiGraph):
+        csr = graph
+    else:
+        csr = CompressedDiGraph(graph, m=m)
+    ptr = csr.nbr_ptr.tolist()
+    idx = csr.nbr_idx.tolist()
+    dirs = csr.nbr_dir.tolist()
+    # direction of the link to each neighbour
+    adj = [dict(itertools.izip(idx[ptr[x]:ptr[x + 1]],
+            dirs[ptr[x]:ptr[x + 1]])) for x in xrange(csr.num_nodes)]
+    counts = [0] * 4096
+    for v in xrange(csr.num_nodes):
+        adj_v = adj[v]
+        ext_v = [u for u in idx[ptr[v]:ptr[v + 1]] if u > v]
+        for (i, w1) in enumerate(ext_v):
+            adj_1 = adj[w1]
+            code_1 = adj_v[w1]
+            # exclusive neighbours of w1 with respect to {v}
+            ext_1 = ext_v[i + 1:] + [u for u in idx[ptr[w1]:ptr[w1 + 1]]
+                    if u > v and u not in adj_v]
+            for (j, w2) in enumerate(ext_1):
+                adj_2 = adj[w2]
+                code_2 = code_1 | (adj_v.get(w2, 0) << 2) |\
+                        (adj_1.get(w2, 0) << 6)
+                # exclusive neighbours of w2 with respect to {v, w1}
+                for w3 in itertools.chain(ext_1[j + 1:], (u for u in
+                        idx[ptr[w2]:ptr[w2 + 1]] if u > v and u != w1 and
+                        u not in adj_v and u not in adj_1)):
+                    counts[code_2 | (adj_v.get(w3, 0) << 4) |
+                            (adj_1.get(w3, 0) << 8) |
+                            (adj_2.get(w3, 0) << 10)] += 1
+    census = dict((mtf, 0) for mtf in mtf_sz4_id2num)
+    for (code, num) in enumerate(counts):
+        if num:
+            census[sz4_code2id[code]] += num
+    return census
+
+def build_csr_index(path, directory=None, dtype=numpy.int32, num_nodes=None,
+        chunk_size=2**22):
+    """
+    Builds an on-disk CSR index of a binary edge list for
+    `out_of_core_triadic_census`.
+
+    The index consists of raw binary arrays in `directory`: the predecessors
+    per node (``in_ptr.bin``, ``in_idx.bin``) and the merged neighbours with
+    link directions (``nbr_ptr.bin``, ``nbr_idx.bin``, ``nbr_dir.bin``) as in
+    `CompressedDiGraph`, plus ``info.json``. Links are processed in chunks, so
+    apart from per-node arrays memory use does not depend on the number of
+    links. An existing index for the same file is reused.
+
+    Parameters
+    ----------
+    path: str
+        File of consecutive (source, target) pairs of integer type `dtype`
+        sorted by source.
+    directory: str (optional)
+        Location of the index, by default `path` with suffix ``.csr``.
+    dtype: numpy.dtype (optional)
+        Integer type of the node indeces in the file.
+    num_nodes: int (optional)
+        Number of nodes, by default the largest index plus one.
+    chunk_size: int (optional)
+        Number of links processed at once.
+
+    Returns
+    -------
+    str:
+        The index directory.
+    """
+    if directory is None:
+        directory = path + ".csr"
+    dtype = numpy.dtype(dtype)
+    stat = os.stat(path)
+    info_path = os.path.join(directory, "info.json")
+    if os.path.exists(info_path):
+        with open(info_path, "r") as file_h:
+            info = json.load(file_h)
+        if info["size"] == stat.st_size and info["mtime"] == stat.st_mtime\
+                and info["dtype"] == dtype.name and (num_nodes is None or\
+                info["num_nodes"] == num_nodes):
+            return directory
+    elif not os.path.isdir(directory):
+        os.makedirs(directory)
+    if stat.st_size % (2 * dtype.itemsize):
+        raise ValueError("file size is not a multiple of a link's size")
+    if stat.st_size == 0:
+        edges = numpy.zeros((0, 2), dtype=dtype)
+    else:
+        edges = numpy.memmap(path, dtype=dtype, mode="r").reshape(-1, 2)
+    num_edges = len(edges)
+    # first pass: degrees and validation
+    last = -1
+    largest = -1
+    out_degree = numpy.zeros(0, dtype=numpy.int64)
+    in_degree = numpy.zeros(0, dtype=numpy.int64)
+    for start in xrange(0, num_edges, chunk_size):
+        chunk = numpy.asarray(edges[start:start + chunk_size], dtype=numpy.int64)
+        if chunk.min() < 0:
+            raise ValueError("negative node index")
+        if chunk[0, 0] < last or numpy.any(chunk[1:, 0] < chunk[:-1, 0]):
+            raise ValueError("links are not sorted by source")
+        last = chunk[-1, 0]
+        largest = max(largest, chunk.max())
+        size = largest + 1
+        out_degree = _grow(out_degree, size) + numpy.bincount(chunk[:, 0],
+                minlength=size)
+        in_degree = _grow(in_degree, size) + numpy.bincount(chunk[:, 1],
+                minlength=size)
+    if num_nodes is None:
+        num_nodes = largest + 1
+    elif num_nodes <= largest:
+        raise ValueError("node index exceeds the number of nodes")
+    n = num_nodes
+    out_ptr = numpy.zeros(n + 1, dtype=numpy.int64)
+    numpy.cumsum(_grow(out_degree, n), out=out_ptr[1:])
+    in_ptr = numpy.zeros(n + 1, dtype=numpy.int64)
+    numpy.cumsum(_grow(in_degree, n), out=in_ptr[1:])
+    del out_degree
+    del in_degree
+    in_ptr.tofile(os.path.join(directory, "in_ptr.bin"))
+    # second pass: counting sort by target, sources stay sorted within rows
+    in_path = os.path.join(directory, "in_idx.bin")
+    if num_edges:
+        in_idx = numpy.memmap(in_path, dtype=dtype, mode="w+",
+                shape=(num_edges,))
+    else:
+        open(in_path, "wb").close()
+        in_idx = numpy.zeros(0, dtype=dtype)
+    cursor = in_ptr[:-1].copy()
+    for start in xrange(0, num_edges, chunk_size):
+        chunk = numpy.asarray(edges[start:start + chunk_size], dtype=numpy.int64)
+        order = numpy.argsort(chunk[:, 1], kind="mergesort")
+        targets = chunk[order, 1]
+        rank = numpy.arange(len(targets)) - numpy.searchsorted(targets,
+                targets, side="left")
+        in_idx[cursor[targets] + rank] = chunk[order, 0]
+        cursor += numpy.bincount(targets, minlength=n)
+    del cursor
+    if num_edges:
+        in_idx.flush()
+    # third pass: merge successors and predecessors in blocks of nodes
+    nbr_ptr = numpy.zeros(n + 1, dtype=numpy.int64)
+    work = out_ptr + in_ptr
+    with open(os.path.join(directory, "nbr_idx.bin"), "wb") as idx_h:
+        with open(os.path.join(directory, "nbr_dir.bin"), "wb") as dir_h:
+            begin = 0
+            while begin < n:
+                end = numpy.searchsorted(work, work[begin] + chunk_size,
+                        side="right") - 1
+                end = min(max(end, begin + 1), n)
+                rows = numpy.concatenate((numpy.repeat(numpy.arange(begin, end),
+                        numpy.diff(out_ptr[begin:end + 1])),
+                        numpy.repeat(numpy.arange(begin, end),
+                        numpy.diff(in_ptr[begin:end + 1]))))
+                cols = numpy.concatenate((numpy.asarray(edges[out_ptr[begin]:
+                        out_ptr[end], 1], dtype=numpy.int64), numpy.asarray(
+                        in_idx[in_ptr[begin]:in_ptr[end]], dtype=numpy.int64)))
+                dirs = numpy.concatenate((numpy.ones(out_ptr[end] -
+                        out_ptr[begin], dtype=numpy.int8), numpy.repeat(
+                        numpy.int8(2), in_ptr[end] - in_ptr[begin])))
+                mask = (rows != cols)
+                keys = (rows[mask] - begin) * n + cols[mask]
+                dirs = dirs[mask]
+                order = numpy.argsort(keys, kind="mergesort")
+                keys = keys[order]
+                dirs = dirs[order]
+                if len(keys):
+                    first = numpy.concatenate(([True], keys[1:] != keys[:-1]))
+                    starts = numpy.nonzero(first)[0]
+                    dirs = numpy.bitwise_or.reduceat(dirs, starts)
+                    keys = keys[starts]
+                nbr_ptr[begin + 1:end + 1] = numpy.bincount(keys // n,
+                        minlength=end - begin)
+                (keys % n).astype(dtype).tofile(idx_h)
+                dirs.tofile(dir_h)
+                begin = end
+    numpy.cumsum(nbr_ptr, out=nbr_ptr)
+    nbr_ptr.tofile(os.path.join(directory, "nbr_ptr.bin"))
+    with open(info_path, "w") as file_h:
+        json.dump({"num_nodes": n, "num_links": num_edges,
+                "dtype": dtype.name, "size": stat.st_size,
+                "mtime": stat.st_mtime}, file_h)
+    return directory
+
+def _grow(counts, size):
+    """
+    Pad an array of counts with zeros to a given length.
+    """
+    if len(counts) >= size:
+        return counts
+    return numpy.concatenate((counts, numpy.zeros(size - len(counts),
+            dtype=counts.dtype)))
+
+def _load_array(directory, name, dtype):
+    path = os.path.join(directory, name)
+    if os.path.getsize(path) == 0:
+        return numpy.zeros(0, dtype=dtype)
+    return numpy.memmap(path, dtype=dtype, mode="r")
+
+def out_of_core_triadic_census(path, directory=None, count_disconnected=False,
+        dtype=numpy.int32, num_nodes=None, block_size=2**16):
+    """
+    Counts all directed triads of a graph given as a binary edge list without
+    loading the graph into memory.
+
+    A memory-mapped CSR index is built once by `build_csr_index` and the nodes
+    are then processed in blocks. Only the neighbours of the current dyad are
+    read from the index, so memory use is proportional to the maximum degree.
+
+    Parameters
+    ----------
+    path: str
+        File of consecutive (source, target) pairs of integer type `dtype`
+        sorted by source. Nodes are the indeces 0 to (number of nodes) - 1.
+    directory: str (optional)
+        Location of the index, by default `path` with suffix ``.csr``.
+    count_disconnected: bool (optional)
+        Determines whether the unconnected triads should be counted as well.
+    dtype: numpy.dtype (optional)
+        Integer type of the node indeces in the file.
+    num_nodes: int (optional)
+        Number of nodes, by default the largest index plus one.
+    block_size: int (optional)
+        Number of nodes whose row pointers are read at once.
+
+    Returns
+    -------
+    dict:
+        Dictionary with triad names as keys and number of occurances as values.
+    """
+    directory = build_csr_index(path, directory, dtype=dtype,
+            num_nodes=num_nodes)
+    with open(os.path.join(directory, "info.json"), "r") as file_h:
+        info = json.load(file_h)
+    n = info["num_nodes"]
+    ptr = _load_array(directory, "nbr_ptr.bin", numpy.int64)
+    idx = _load_array(directory, "nbr_idx.bin", numpy.dtype(str(info["dtype"])))
+    dirs = _load_array(directory, "nbr_dir.bin", numpy.int8)
+    codes = [c - 1 for c in tricodes]
+    counts = [0] * 16
+    for begin in xrange(0, n, block_size):
+        end = min(begin + block_size, n)
+        block = ptr[begin:end + 1].tolist()
+        for v in xrange(begin, end):
+            v_idx = idx[block[v - begin]:block[v - begin + 1]].tolist()
+            v_dirs = dirs[block[v - begin]:block[v - begin + 1]].tolist()
+            v_stop = len(v_idx)
+            for (i, u) in enumerate(v_idx):
+                if u <= v:
+                    continue
+                link = v_dirs[i]
+                u_idx = idx[ptr[u]:ptr[u + 1]].tolist()
+                u_dirs = dirs[ptr[u]:ptr[u + 1]].tolist()
+                (triads, size) = _merge_neighbours(v, u, link, v_idx, v_dirs,
+                        0, v_stop, u_idx, u_dirs, 0, len(u_idx))
+                for (w, code) in triads:
+                    counts[codes[code]] += 1
+                # calculate dyadic triads instead of counting them
+                if count_disconnected:
+                    if link == 3:
+                        counts[2] += n - size - 2
+                    else:
+                        counts[1] += n - size - 2
+    return _census_from_counts(counts, n, count_disconnected)
+
+def undirected_census(graph, m=None):
+    """
+    Counts triangles and open wedges (paths of length two whose ends are not
+    linked) of an undirected graph, per node and in total.
+
+    Links are oriented from the node of lower to higher (degree, index) rank so
+    that every node keeps at most O(sqrt(m)) forward neighbours. Each triangle
+    is then found exactly once by intersecting the sorted forward neighbours of
+    the two ends of a link, which takes O(m sqrt(m)) time. Wedges and
+    clustering follow from the degrees in vectorised form.
+
+    Parameters
+    ----------
+    graph: undirected graph
+        A graph whose interface should resemble a ``networkx.Graph``.
+    m: dict (optional)
+        A map between nodes in the graph and contiguous indeces from 0 to
+        (number of nodes) - 1.
+
+    Returns
+    -------
+    dict:
+        The total number of "triangles" and open "wedges".
+    numpy.ndarray:
+        The number of triangles of each node in the order of the indeces.
+    numpy.ndarray:
+        The local clustering coefficient of each node, zero for nodes with
+        fewer than two neighbours.
+    """
+    if graph.is_directed():
+        raise nx.NetworkXError("not defined for directed graphs")
+    if graph.is_multigraph():
+        raise nx.NetworkXError("not defined for multigraphs")
+    if m:
+        nodes = sorted(graph.nodes_iter(), key=m.get)
+    else:
+        nodes = sorted(graph.nodes_iter())
+        m = dict(itertools.izip(nodes, itertools.count()))
+    n = len(nodes)
+    num_edges = graph.size()
+    src = numpy.fromiter((m[u] for (u, v) in graph.edges_iter()),
+            dtype=numpy.int64, count=num_edges)
+    tar = numpy.fromiter((m[v] for (u, v) in graph.edges_iter()),
+            dtype=numpy.int64, count=num_edges)
+    # the merged neighbours of a directed snapshot are the undirected ones
+    csr = CompressedDiGraph.from_edges(n, src, tar, nodes)
+    degree = csr.degree()
+    rank = numpy.zeros(n, dtype=numpy.int64)
+    rank[numpy.lexsort((numpy.arange(n), degree))] = numpy.arange(n)
+    rows = numpy.repeat(numpy.arange(n), degree)
+    forward = rank[csr.nbr_idx] > rank[rows]
+    fwd_ptr = numpy.zeros(n + 1, dtype=numpy.int64)
+    numpy.cumsum(numpy.bincount(rows[forward], minlength=n), out=fwd_ptr[1:])
+    fwd_idx = csr.nbr_idx[forward]
+    ptr = fwd_ptr.tolist()
+    later = [frozenset(fwd_idx[ptr[u]:ptr[u + 1]].tolist()) for u in xrange(n)]
+    triangles = [0] * n
+    for u in xrange(n):
+        later_u = later[u]
+        for v in later_u:
+            for w in later_u.intersection(later[v]):
+                triangles[u] += 1
+                triangles[v] += 1
+                triangles[w] += 1
+    triangles = numpy.array(triangles, dtype=numpy.int64)
+    total = int(triangles.sum()) // 3
+    pairs = degree * (degree - 1) // 2
+    wedges = int(pairs.sum()) - 3 * total
+    clustering = numpy.zeros(n)
+    mask = pairs > 0
+    clustering[mask] = triangles[mask] / pairs[mask].astype(float)
+    return ({"triangles": total, "wedges": wedges}, triangles, clustering)
+
+
+class CensusCache(object):
+    """
+    Least recently used store of census results, optionally backed by a
+    directory on disk.
+
+    Results are keyed by a hash of the sorted link arrays of a
+    `CompressedDiGraph`, its number of nodes and the `count_disconnected` flag,
+    so any change to the links leads to a different key.
+    """
+
+    def __init__(self, max_size=128, directory=None):
+        """
+        Parameters
+        ----------
+        max_size: int (optional)
+            Number of results kept in memory.
+        directory: str (optional)
+            Results are also written to and read from JSON files in here.
+        """
+        object.__init__(self)
+        self.max_size = max_size
+        self.directory = directory
+        self._store = collections.OrderedDict()
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    @staticmethod
+    def fingerprint(csr, count_disconnected=False):
+        digest = hashlib.sha1()
+        digest.update(numpy.ascontiguousarray(csr.out_ptr,
+                dtype=numpy.int64).tostring())
+        digest.update(numpy.ascontiguousarray(csr.out_idx,
+                dtype=numpy.int64).tostring())
+        digest.update("1" if count_disconnected else "0")
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, "%s.json" % key)
+
+    def get(self, key):
+        """
+        Returns
+        -------
+        dict or None:
+            The stored census or None if unknown.
+        """
+        if key in self._store:
+            census = self._store.pop(key)
+            self._store[key] = census
+            return census
+        if self.directory and os.path.exists(self._path(key)):
+            with open(self._path(key), "r") as file_h:
+                census = json.load(file_h)
+            census = dict((str(name), num) for (name, num) in\
+                    census.iteritems())
+            self._remember(key, census)
+            return census
+        return None
+
+    def put(self, key, census):
+        census = dict(census)
+        self._remember(key, census)
+        if self.directory:
+            with open(self._path(key), "w") as file_h:
+                json.dump(census, file_h)
+
+    def _remember(self, key, census):
+        self._store.pop(key, None)
+        self._store[key] = census
+        while len(self._store) > self.max_size:
+            self._store.popitem(last=False)
+
+    def clear(self):
+        self._store.clear()
+
+
+class TriadSink(object):
+    """
+    Receives recorded triads in buffered chunks.
+
+    Triples are collected per triad type in the lists of `record` (ordered as
+    `triad_names`) and whenever `buffer_size` of them are present they are
+    passed on as an (k, 3) array of `dtype` to `write`, which calls
+    `callback(name, triples)` unless overridden.
+    """
+
+    def __init__(self, callback=None, buffer_size=2**16, dtype=numpy.int32):
+        """
+        Parameters
+        ----------
+        callback: callable (optional)
+            Called with the triad name and an array of index triples, required
+            unless a subclass overrides `write`.
+        buffer_size: int (optional)
+            Number of triples of one type that are buffered before writing.
+        dtype: numpy.dtype (optional)
+            Integer type of the triples, numpy.int64 is required for more than
+            2**31 - 1 nodes.
+        """
+        object.__init__(self)
+        if callback is None and\
+                type(self).write.__func__ is TriadSink.write.__func__:
+            raise ValueError("a callback or an overridden write is required")
+        self.callback = callback
+        self.buffer_size = buffer_size
+        self.dtype = numpy.dtype(dtype)
+        self.record = [list() for name in triad_names]
+
+    def collect(self, force=False):
+        """
+        Write all buffers that are full or, if forced, not empty.
+        """
+        for (i, triples) in enumerate(self.record):
+            if triples and (force or len(triples) >= self.buffer_size):
+                self.write(triad_names[i], numpy.array(triples,
+                        dtype=self.dtype).reshape(-1, 3))
+                del triples[:]
+
+    def extend(self, record):
+        """
+        Add the triples of another record to the buffers.
+        """
+        for (i, triples) in enumerate(record):
+            self.record[i].extend(triples)
+        self.collect()
+
+    def write(self, name, triples):
+        self.callback(name, triples)
+
+
+class TriadFileSink(TriadSink):
+    """
+    Writes recorded triads to one binary file per triad name in a directory.
+
+    Each file consists of consecutive fixed-width index triples and can be
+    opened as a memory-mapped array with `load_triads`.
+    """
+
+    def __init__(self, directory, buffer_size=2**16, dtype=numpy.int32):
+        """
+        Parameters
+        ----------
+        directory: str
+            Existing files with recorded triads in it are truncated.
+        buffer_size: int (optional)
+            Number of triples of one type that are buffered before writing.
+        dtype: numpy.dtype (optional)
+            Integer type of the triples.
+        """
+        TriadSink.__init__(self, buffer_size=buffer_size, dtype=dtype)
+        self.directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        for name in triad_names:
+            open(self.path(name), "wb").close()
+
+    def path(self, name):
+        return os.path.join(self.directory, "%s.bin" % name)
+
+    def write(self, name, triples):
+        with open(self.path(name), "ab") as file_h:
+            triples.tofile(file_h)
+
+def load_triads(directory, name, dtype=numpy.int32):
+    """
+    Memory-map the triads of one type written by a `TriadFileSink`.
+
+    Returns
+    -------
+    numpy.memmap:
+        A read-only (k, 3) array of index triples.
+    """
+    path = os.path.join(directory, "%s.bin" % name)
+    if os.path.getsize(path) == 0:
+        return numpy.zeros((0, 3), dtype=dtype)
+    return numpy.memmap(path, dtype=dtype, mode="r").reshape(-1, 3)
+
+
+class _IntensitySink(TriadSink):
+    """
+    Evaluates the intensity and coherence of chunks of recorded triads.
+    """
+
+    def __init__(self, csr, weights, buffer_size):
+        TriadSink.__init__(self, buffer_size=buffer_size, dtype=numpy.int64)
+        n = csr.num_nodes
+        self.n = n
+        # weights of both directions aligned with the merged neighbours
+        self.keys = numpy.repeat(numpy.arange(n), csr.degree()) * n +\
+                csr.nbr_idx
+        self.dirs = csr.nbr_dir
+        out_keys = numpy.repeat(numpy.arange(n), numpy.diff(csr.out_ptr)) *\
+                n + csr.out_idx
+        out_rows = out_keys // n
+        out_cols = out_keys % n if n else out_keys
+        self.forward = numpy.zeros(len(self.keys))
+        self.forward[numpy.searchsorted(self.keys, out_keys)] = weights
+        self.backward = numpy.zeros(len(self.keys))
+        self.backward[numpy.searchsorted(self.keys, out_cols * n + out_rows)] =\
+                weights
+        self.intensity = numpy.zeros(16)
+        self.coherence = numpy.zeros(16)
+
+    def write(self, name, triples):
+        columns = list()
+        present = list()
+        for (a, b) in ((0, 1), (0, 2), (1, 2)):
+            query = triples[:, a] * self.n + triples[:, b]
+            pos = numpy.searchsorted(self.keys, query)
+            pos[pos == len(self.keys)] = 0
+            found = (self.keys[pos] == query)
+            columns.append(self.forward[pos])
+            present.append(found & (self.dirs[pos] & 1 > 0))
+            columns.append(self.backward[pos])
+            present.append(found & (self.dirs[pos] & 2 > 0))
+        values = numpy.column_stack(columns)
+        present = numpy.column_stack(present)
+        num = present.sum(axis=1)
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            logs = numpy.where(present, numpy.log(values), 0.0).sum(axis=1)
+            intensity = numpy.exp(logs / num)
+            coherence = intensity * num / numpy.where(present, values,
+                    0.0).sum(axis=1)
+        i = triad_names.index(name)
+        self.intensity[i] += intensity.sum()
+        self.coherence[i] += coherence.sum()
+
+def weighted_triadic_census(graph, m=None, weight="weight", weights=None,
+        n_jobs=1, buffer_size=2**16):
+    """
+    Counts all directed triads together with their summed intensity and
+    coherence.
+
+    The intensity of a triad is the geometric mean of its link weights and its
+    coherence the ratio of geometric to arithmetic mean. Triads are streamed
+    from the array-backed census in chunks whose weights are looked up and
+    combined with vectorised operations.
+
+    Parameters
+    ----------
+    graph : directed graph
+        A graph whose interface should resemble a ``networkx.DiGraph`` or a
+        `CompressedDiGraph`.
+    m: dict (optional)
+        A map between nodes in the graph and contiguous indeces from 0 to
+        (number of nodes) - 1.
+    weight: str (optional)
+        Link attribute holding the weights (default 1.0) of a graph.
+    weights: array-like (optional)
+        Positive link weights aligned with `out_idx` of a `CompressedDiGraph`,
+        taken from its `weights` by default.
+    n_jobs: int (optional)
+        Number of worker processes, `None` uses all available CPUs.
+    buffer_size: int (optional)
+        Number of triads of one type evaluated at once.
+
+    Returns
+    -------
+    dict:
+        Dictionary with triad names as keys and number of occurances as values.
+    dict:
+        Dictionary with triad names as keys and summed intensities as values.
+    dict:
+        Dictionary with triad names as keys and summed coherences as values.
+
+    References
+    ----------
+    .. [1] J.-P. Onnela, J. Saramaki, J. Kertesz, and K. Kaski, Intensity and
+        coherence of motifs in weighted complex networks, Physical Review E,
+        71:065103 (2005)
+    """
+    if isinstance(graph, CompressedDiGraph):
+        csr = graph
+    else:
+        csr = CompressedDiGraph(graph, m=m, weight=weight)
+    if weights is None:
+        weights = csr.weights
+    if weights is None:
+        raise ValueError("no link weights available")
+    weights = numpy.asarray(weights, dtype=float)
+    if len(weights) != len(csr.out_idx):
+        raise ValueError("weights are not aligned with the links")
+    sink = _IntensitySink(csr, weights, buffer_size)
+    census = compressed_triadic_census(csr, n_jobs=n_jobs, sink=sink)
+    names = triad_names[3:]
+    intensity = dict(itertools.izip(names, sink.intensity[3:].tolist()))
+    coherence = dict(itertools.izip(names, sink.coherence[3:].tolist()))
+    return (census, intensity, coherence)
+
+def _dyad_triads(ptr, idx, dirs, v, u, link, shares, row):
+    """
+    Add the shares of all triads containing the connected dyad (v, u) to `row`
+    and return the number of third nodes adjacent to v or u.
+    """
+    codes = tricodes
+    (triads, size) = _merge_neighbours(v, u, link, idx, dirs, ptr[v],
+            ptr[v + 1], idx, dirs, ptr[u], ptr[u + 1], every=True)
+    for (w, code) in triads:
+        code = codes[code] - 1
+        row[code] += shares[code]
+    return size
+
+def approximate_triadic_census(graph, m=None, count_disconnected=False,
+        samples=10000, time_limit=None, rel_error=None, batch_size=1000,
+        seed=None):
+    """
+    Estimates the triadic census from uniformly sampled connected dyads.
+
+    Every connected triad contains two or three connected dyads and every
+    triad with a single link exactly one. For a sampled dyad all triads
+    containing it are found by merging the neighbours of its two nodes and
+    each contributes the inverse of its number of connected dyads. Scaling the
+    mean contribution by the number of connected dyads yields unbiased
+    estimates whose standard errors follow from the sample variance.
+
+    Parameters
+    ----------
+    graph : directed graph
+        A graph whose interface should resemble a ``networkx.DiGraph`` or a
+        `CompressedDiGraph`.
+    m: dict (optional)
+        A map between nodes in the graph graph and their indeces.
+    count_disconnected: bool (optional)
+        Determines whether the unconnected triads should be estimated as well.
+    samples: int (optional)
+        Maximum number of dyads sampled (with replacement). If None, sampling
+        only stops on `time_limit` or `rel_error`.
+    time_limit: float (optional)
+        Maximum run time in seconds, checked after each batch.
+    rel_error: float (optional)
+        Stop as soon as the relative standard error of every connected triad
+        type with a non-zero estimate is at most this value.
+    batch_size: int (optional)
+        Number of dyads sampled at once.
+    seed: int (optional)
+        Define a fixed seed for the random number generator, for repeatable
+        experiments.
+
+    Returns
+    -------
+    dict:
+        Dictionary with triad names as keys and estimated number of occurances
+        as values.
+    dict:
+        Dictionary with triad names as keys and standard errors as values.
+    """
+    if samples is None and time_limit is None and rel_error is None:
+        raise ValueError("samples, time_limit or rel_error must be given")
+    if seed:
+        numpy.random.seed(seed)
+    if isinstance(graph, CompressedDiGraph):
+        csr = graph
+    else:
+        csr = CompressedDiGraph(graph, m=m)
+    n = csr.num_nodes
+    entries = len(csr.nbr_idx)
+    num_dyads = entries // 2
+    # fraction of a triad that a single connected dyad accounts for
+    shares = [1.0] * 3 + [0.5] * 5 + [1.0 / 3.0] * 2 + [0.5] + [1.0 / 3.0] * 5
+    totals = numpy.zeros(16)
+    squares = numpy.zeros(16)
+    # squared sums of all non-null contributions per sample
+    spans = 0.0
+    drawn = 0
+    if num_dyads > 0:
+        ptr = csr.nbr_ptr.tolist()
+        idx = csr.nbr_idx.tolist()
+        dirs = csr.nbr_dir.tolist()
+        start = time.time()
+        while samples is None or drawn < samples:
+            if samples is None:
+                size = batch_size
+            else:
+                size = min(batch_size, samples - drawn)
+            # each dyad appears twice among the neighbour entries
+            picks = numpy.random.randint(0, entries, size)
+            rows = numpy.searchsorted(csr.nbr_ptr, picks, side="right") - 1
+            values = numpy.zeros((size, 16))
+            for (i, (v, e)) in enumerate(itertools.izip(rows.tolist(),
+                    picks.tolist())):
+                row = [0.0] * 16
+                extent = _dyad_triads(ptr, idx, dirs, v, idx[e], dirs[e],
+                        shares, row)
+                if dirs[e] == 3:
+                    row[2] = n - extent - 2
+                else:
+                    row[1] = n - extent - 2
+                values[i] = row
+            totals += values.sum(axis=0)
+            squares += (values * values).sum(axis=0)
+            spans += numpy.square(values[:, 1:].sum(axis=1)).sum()
+            drawn += size
+            if time_limit is not None and time.time() - start >= time_limit:
+                break
+            if rel_error is not None and drawn > 1:
+                mean = totals[3:] / drawn
+                error = numpy.sqrt(numpy.maximum(squares[3:] / drawn -
+                        mean * mean, 0.0) / (drawn - 1))
+                found = mean > 0.0
+                if numpy.all(error[found] <= rel_error * mean[found]):
+                    break
+    if drawn > 0:
+        mean = totals / drawn
+        variance = numpy.maximum(squares / drawn - mean * mean, 0.0)
+        error = num_dyads * numpy.sqrt(variance / max(drawn - 1, 1))
+        estimate = num_dyads * mean
+    else:
+        estimate = numpy.zeros(16)
+        error = numpy.zeros(16)
+    if count_disconnected:
+        total = (n * (n - 1) * (n - 2)) / 6
+        estimate[0] = total - estimate[1:].sum()
+        # the error of the null triads is that of the sum of all others
+        if drawn > 0:
+            other = totals[1:].sum() / drawn
+            error[0] = num_dyads * numpy.sqrt(max(spans / drawn -
+                    other * other, 0.0) / max(drawn - 1, 1))
+        census = dict(itertools.izip(triad_names, estimate.tolist()))
+        errors = dict(itertools.izip(triad_names, error.tolist()))
+    else:
+        census = dict(itertools.izip(triad_names[3:], estimate[3:].tolist()))
+        errors = dict(itertools.izip(triad_names[3:], error[3:].tolist()))
+    return (census, errors)
+
+
+class IncrementalTriadicCensus(object):
+    """
+    Triadic census of a directed graph that is kept up to date while links
+    are added or removed.
+
+    Only the triads containing both end points of a changed link can change
+    type, so each update costs O(deg(u) + deg(v)). Changes must be applied
+    through `add_edge` and `remove_edge` (which also modify the graph), an
+    instance can serve as the `census` of a `NetworkRewiring` object.
+    Self-links are passed on to the graph but do not affect the census.
+    """
+
+    def __init__(self, graph=None, count_disconnected=False):
+        """
+        Parameters
+        ----------
+        graph: directed graph (optional)
+            A graph whose interface should resemble a ``networkx.DiGraph``.
+        count_disconnected: bool (optional)
+            Determines whether the unconnected triads are part of the census
+            returned by `census`. They are tracked either way.
+        """
+        object.__init__(self)
+        self.count_disconnected = count_disconnected
+        self.graph = None
+        self.counts = [0] * 16
+        self.dyads = [0, 0, 0]
+        if graph is not None:
+            self.attach(graph)
+
+    def attach(self, graph, same_as=None):
+        """
+        Count the triads of a graph from scratch.
+
+        Parameters
+        ----------
+        graph: directed graph
+            The graph whose census is tracked from now on.
+        same_as: directed graph (optional)
+            A graph known to be structurally identical to `graph`, e.g., the
+            template it was copied from. If the census currently describes
+            `same_as` (or `graph` itself) the counts are kept as they are.
+        """
+        if self.graph is not None and (self.graph is graph or\
+                self.graph is same_as):
+            self.graph = graph
+            return
+        if not graph.is_directed():
+            raise nx.NetworkXError("not defined for undirected graphs")
+        self.graph = graph
+        census = compressed_triadic_census(CompressedDiGraph(graph),
+                count_disconnected=True)
+        self.counts = [census[name] for name in triad_names]
+        n = graph.order()
+        mutual = sum(1 for (u, v) in graph.edges_iter()
+                if u != v and graph.has_edge(v, u)) // 2
+        asym = graph.size() - graph.number_of_selfloops() - 2 * mutual
+        self.dyads = [(n * (n - 1)) // 2 - asym - mutual, asym, mutual]
+
+    def census(self):
+        """
+        Returns
+        -------
+        dict:
+            Dictionary with triad names as keys and number of occurances as
+            values, as `triadic_census` would report it.
+        """
+        return _census_from_counts(self.counts, self.graph.order(),
+                self.count_disconnected)
+
+    def add_node(self, node):
+        if node in self.graph:
+            return
+        # every dyad of the existing nodes forms a new triad with the node
+        self.counts[0] += self.dyads[0]
+        self.counts[1] += self.dyads[1]
+        self.counts[2] += self.dyads[2]
+        self.dyads[0] += self.graph.order()
+        self.graph.add_node(node)
+
+    def _toggle(self, src, tar, add):
+        graph = self.graph
+        succ = graph.succ
+        pred = graph.pred
+        # the link src -> tar carries the bit 1 in the triad code (src, tar, w)
+        back = 2 if src in succ[tar] else 0
+        nbrs = set(succ[src])
+        nbrs.update(pred[src])
+        nbrs.update(succ[tar])
+        nbrs.update(pred[tar])
+        nbrs.discard(src)
+        nbrs.discard(tar)
+        counts = self.counts
+        for w in nbrs:
+            code = back
+            if w in succ[src]:
+                code += 4
+            if w in pred[src]:
+                code += 8
+            if w in succ[tar]:
+                code += 16
+            if w in pred[tar]:
+                code += 32
+            if add:
+                counts[tricodes[code] - 1] -= 1
+                counts[tricodes[code + 1] - 1] += 1
+            else:
+                counts[tricodes[code + 1] - 1] -= 1
+                counts[tricodes[code] - 1] += 1
+        # triads with a third node unconnected to both are dyadic
+        rest = graph.order() - len(nbrs) - 2
+        old = back // 2
+        if add:
+            counts[old] -= rest
+            counts[old + 1] += rest
+            self.dyads[old] -= 1
+            self.dyads[old + 1] += 1
+        else:
+            counts[old + 1] -= rest
+            counts[old] += rest
+            self.dyads[old + 1] -= 1
+            self.dyads[old] += 1
+
+    def add_edge(self, src, tar):
+        """
+        Add the link src -> tar to the graph and update the census.
+        """
+        self.add_node(src)
+        self.add_node(tar)
+        if src == tar or tar in self.graph.succ[src]:
+            self.graph.add_edge(src, tar)
+            return
+        self._toggle(src, tar, True)
+        self.graph.add_edge(src, tar)
+
+    def remove_edge(self, src, tar):
+        """
+        Remove the link src -> tar from the graph and update the census.
+        """
+        if src != tar and self.graph.has_edge(src, tar):
+            self.graph.remove_edge(src, tar)
+            self._toggle(src, tar, False)
+        else:
+            self.graph.remove_edge(src, tar)
+
+def windowed_triadic_census(stream, width, step, start=None, nodes=None,
+        count_disconnected=False):
+    """
+    Computes the triadic census for every time window of a stream of links.
+
+    Links enter the census when the window reaches them and leave it once the
+    window has passed, each change costing O(deg(u) + deg(v)) through an
+    `IncrementalTriadicCensus`. A link occurring several times in a window is
+    present until its last occurrence expires.
+
+    Parameters
+    ----------
+    stream: iterable
+        Triples (source, target, time) sorted by time.
+    width: numeral
+        Duration of a window, links with start <= time < start + width belong
+        to it.
+    step: numeral
+        Offset between the starts of consecutive windows.
+    start: numeral (optional)
+        Start of the first window, by default the time of the first link.
+    nodes: iterable (optional)
+        All nodes of the network, otherwise nodes are added once they appear
+        in the stream. This matters for the unconnected triads.
+    count_disconnected: bool (optional)
+        Determines whether the unconnected triads should be counted as well,
+        otherwise their columns are zero.
+
+    Returns
+    -------
+    numpy.ndarray:
+        The start times of the windows.
+    numpy.ndarray:
+        A (number of windows x 16) integer array, one census per window with
+        columns ordered as `triad_names`.
+    """
+    if width <= 0 or step <= 0:
+        raise ValueError("window width and step must be positive")
+    tracker = IncrementalTriadicCensus(nx.DiGraph(),
+            count_disconnected=count_disconnected)
+    if nodes is not None:
+        for node in nodes:
+            tracker.add_node(node)
+    stream = iter(stream)
+    active = collections.deque()
+    multiplicity = collections.defaultdict(int)
+    starts = list()
+    table = numpy.zeros((64, 16), dtype=numpy.int64)
+    upcoming = next(stream, None)
+    if start is None:
+        if upcoming is None:
+            return (numpy.zeros(0), table[:0])
+        start = upcoming[2]
+    last = None
+    i = 0
+    while True:
+        begin = start + i * step
+        end = begin + width
+        # expire links that the window has passed
+        while active and active[0][2] < begin:
+            (src, tar, when) = active.popleft()
+            multiplicity[(src, tar)] -= 1
+            if multiplicity[(src, tar)] == 0:
+                del multiplicity[(src, tar)]
+                tracker.remove_edge(src, tar)
+        # insert links that the window has reached
+        while upcoming is not None and upcoming[2] < end:
+            (src, tar, when) = upcoming[:3]
+            if last is not None and when < last:
+                raise ValueError("links are not sorted by time")
+            last = when
+            if when >= begin:
+                active.append((src, tar, when))
+                multiplicity[(src, tar)] += 1
+                if multiplicity[(src, tar)] == 1:
+                    tracker.add_edge(src, tar)
+            upcoming = next(stream, None)
+        if i == len(table):
+            table = numpy.concatenate((table, numpy.zeros((max(len(table),
+                    1), 16), dtype=table.dtype)))
+        if count_disconnected:
+            table[i] = tracker.counts
+        else:
+            table[i, 3:] = tracker.counts[3:]
+        starts.append(begin)
+        i += 1
+        # stop once no link can be part of the next window
+        if upcoming is None and (last is None or last < begin + step):
+            break
+    return (numpy.array(starts), table[:i])
+
+################################################################################
+
+if __name__ == "__main__":
+    import sys
+    from . import benchmark
+    sys.exit(benchmark.main())
@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+"""
+======================
+Network Rewiring Tests
+======================
+
+:Author:
+    Moritz Emanuel Beber
+:Date:
+    2011-03-01
+:Copyright:
+    Copyright(c) 2011 Jacobs University of Bremen. All rights reserved.
+:File:
+    test_randomisation.py
+"""
+
+
+import os
+import shutil
+import tempfile
+import numpy
+import networkx as nx
+import meb.utils.network.randomisation as rnd
+import meb.utils.network.subgraphs as sub
+import meb.utils.network.classes as classes
+
+
+def reciprocal_digraph(num_nodes=200, prob=0.03, seed=1):
+    """
+    A random directed graph in which every fifth link is made bidirectional.
+    """
+    graph = nx.gnp_random_graph(num_nodes, prob, directed=True, seed=seed)
+    for (u, v) in graph.edges()[::5]:
+        graph.add_edge(v, u)
+    return graph
+
+def directed_profile(graph):
+    """
+    In-, out- and bidirectional degree of every node.
+    """
+    return dict((node, (graph.in_degree(node), graph.out_degree(node),
+            sum(1 for nbr in graph.successors_iter(node) if
+            graph.has_edge(nbr, node)))) for node in graph)
+
+def test_directed_rewiring():
+    graph = reciprocal_digraph()
+    profile = directed_profile(graph)
+    links = sorted(graph.edges())
+    overlay = rnd.NetworkRewiring()
+    overlay.overlay = True
+    outcomes = list()
+    for rewiring in (rnd.NetworkRewiring(), rnd.ArrayRewiring(), overlay):
+        numpy.random.seed(1)
+        (result, success) = rewiring.randomise(graph, flip=5)
+        assert 0.0 < success <= 1.0
+        assert result is not graph
+        assert result.number_of_selfloops() == 0
+        assert directed_profile(result) == profile
+        assert sorted(result.edges()) != links
+        outcomes.append((sorted(result.edges()), success))
+    # all engines draw the same switches under the same seed
+    assert outcomes[0] == outcomes[1] == outcomes[2]
+    assert sorted(graph.edges()) == links
+
+class UncopiedDiGraph(nx.DiGraph):
+
+    def copy(self):
+        raise AssertionError("the template was copied")
+
+def test_overlay_rewiring():
+    graph = UncopiedDiGraph(reciprocal_digraph())
+    profile = directed_profile(graph)
+    rewiring = rnd.NetworkRewiring()
+    rewiring.overlay = True
+    numpy.random.seed(1)
+    (result, success) = rewiring.randomise(graph, flip=5)
+    assert isinstance(result, rnd.OverlayGraph) and result.template is graph
+    assert directed_profile(result) == profile
+    links = nx.DiGraph()
+    links.add_nodes_from(graph)
+    links.add_edges_from(result.edges_iter())
+    assert links.size() == result.size() == graph.size()
+    # the census functions work on the overlay without building a graph
+    assert sub.triadic_census(result, count_disconnected=True) ==\
+            sub.triadic_census(links, count_disconnected=True)
+    assert (sub.census_statistic(result) == sub.census_statistic(links)).all()
+    assert len(list(sub.iter_random_ensemble(graph, 2, flip=1, seed=1,
+            n_jobs=1, rewiring=rewiring))) == 2
+    for (sample, success) in rewiring.sample(graph, 2, flip=1, thin=1):
+        assert sample is rewiring.graph
+    materialised = rnd.OverlayGraph(reciprocal_digraph())
+    materialised.remove_edge(*materialised.edges()[0])
+    assert sorted(materialised.materialise().edges()) ==\
+            sorted(materialised.edges())
+
+class Killed(Exception):
+    pass
+
+def test_checkpoint_resume():
+    graph = reciprocal_digraph()
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "chain.npz")
+    try:
+        for cls in (rnd.NetworkRewiring, rnd.ArrayRewiring):
+            numpy.random.seed(2)
+            (expected, success) = cls().randomise(graph, flip=4)
+            # interrupt the run after its second checkpoint
+            rewiring = cls()
+            rewiring.checkpoint = path
+            rewiring.checkpoint_interval = 1000
+            rewiring.batch_size = 500
+            saves = list()
+            save = rewiring._save_checkpoint
+
+            def kill(sets, track):
+                save(sets, track)
+                saves.append(True)
+                if len(saves) == 2:
+                    raise Killed()
+
+            rewiring._save_checkpoint = kill
+            numpy.random.seed(2)
+            try:
+                rewiring.randomise(graph, flip=4)
+            except Killed:
+                pass
+            assert len(saves) == 2
+            numpy.random.seed(3)
+            (result, resumed) = cls().resume(graph, path)
+            assert resumed == success
+            assert sorted(result.edges()) == sorted(expected.edges())
+    finally:
+        shutil.rmtree(directory)
+
+def test_resume_census():
+    graph = reciprocal_digraph(num_nodes=60, prob=0.06)
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "chain.npz")
+    try:
+        rewiring = rnd.NetworkRewiring()
+        rewiring.checkpoint = path
+        rewiring.checkpoint_interval = 1
+        rewiring.batch_size = 100
+        numpy.random.seed(2)
+        rewiring.randomise(graph, flip=1)
+        for copy in (True, False):
+            template = graph.copy()
+            rewiring = rnd.NetworkRewiring()
+            rewiring.census = sub.IncrementalTriadicCensus()
+            rewiring.census.attach(template)
+            (result, success) = rewiring.resume(template, path, copy=copy)
+            assert (result is template) != copy
+            assert rewiring.census.census() == sub.triadic_census(result)
+    finally:
+        shutil.rmtree(directory)
+
+def test_undirected_rewiring():
+    graph = nx.gnm_random_graph(200, 800, seed=1)
+    links = set(frozenset(link) for link in graph.edges_iter())
+    numpy.random.seed(1)
+    (result, success) = rnd.UndirectedRewiring().randomise(graph, flip=3)
+    assert not result.is_directed()
+    assert result.degree() == graph.degree()
+    assert result.number_of_selfloops() == 0
+    assert set(frozenset(link) for link in result.edges_iter()) != links
+    try:
+        rnd.UndirectedRewiring().randomise(reciprocal_digraph())
+    except nx.NetworkXError:
+        pass
+    else:
+        raise AssertionError("accepted a directed graph")
+
+def test_bipartite_rewiring():
+    graph = classes.BipartiteGraph()
+    graph.add_nodes_from(xrange(50), pop=1)
+    graph.add_nodes_from(xrange(50, 120), pop=-1)
+    generator = numpy.random.RandomState(1)
+    while graph.size() < 400:
+        graph.add_edge(int(generator.randint(50)),
+                int(generator.randint(50, 120)))
+    numpy.random.seed(1)
+    (result, success) = rnd.BipartiteRewiring().randomise(graph, flip=3)
+    assert isinstance(result, classes.BipartiteGraph)
+    assert result.degree() == graph.degree()
+    assert all(result.node[node]["pop"] == graph.node[node]["pop"] for node in
+            graph)
+    assert all(result.node[u]["pop"] != result.node[v]["pop"] for (u, v) in
+            result.edges_iter())
+    assert sorted(result.edges()) != sorted(graph.edges())
+
+def strengths(graph):
+    return (numpy.array([graph.out_degree(node, weight="weight") for node in
+            sorted(graph)]), numpy.array([graph.in_degree(node,
+            weight="weight") for node in sorted(graph)]))
+
+def test_weighted_rewiring():
+    graph = reciprocal_digraph()
+    generator = numpy.random.RandomState(1)
+    for (u, v) in graph.edges_iter():
+        graph[u][v]["weight"] = float(generator.exponential(2.0))
+    weights = sorted(data["weight"] for (u, v, data) in
+            graph.edges_iter(data=True))
+    profile = directed_profile(graph)
+    (out_strength, in_strength) = strengths(graph)
+    deviation = list()
+    for swap in (False, True):
+        numpy.random.seed(1)
+        rewiring = rnd.WeightedRewiring(swap_weights=swap)
+        (result, success) = rewiring.randomise(graph, flip=5)
+        assert directed_profile(result) == profile
+        assert sorted(data["weight"] for (u, v, data) in
+                result.edges_iter(data=True)) == weights
+        (out_result, in_result) = strengths(result)
+        if not swap:
+            assert numpy.allclose(out_result, out_strength)
+        deviation.append(numpy.square(out_result - out_strength).sum() +
+                numpy.square(in_result - in_strength).sum())
+    # weight swaps reduce the squared deviation from the original strengths
+    assert deviation[1] < deviation[0]
+
+
+if __name__ == "__main__":
+    test_directed_rewiring()
+    test_overlay_rewiring()
+    test_checkpoint_resume()
+    test_resume_census()
+    test_undirected_rewiring()
+    test_bipartite_rewiring()
+    test_weighted_rewiring()
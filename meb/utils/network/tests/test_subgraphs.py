@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+"""
+=====================
+Subgraph Census Tests
+=====================
+
+:Author:
+    Moritz Emanuel Beber
+:Date:
+    2011-06-20
+:Copyright:
+    Copyright(c) 2011 Jacobs University of Bremen. All rights reserved.
+:File:
+    test_subgraphs.py
+"""
+
+
+import os
+import shutil
+import tempfile
+import itertools
+import numpy
+import networkx as nx
+import meb.utils.network.subgraphs as sub
+
+
+def random_digraphs(num=12, max_nodes=25):
+    """
+    Small random directed graphs of varying density, each with a self-link.
+    """
+    for seed in xrange(num):
+        n = 3 + (seed * 7) % max_nodes
+        graph = nx.gnp_random_graph(n, 0.05 + 0.03 * seed, directed=True,
+                seed=seed)
+        graph.add_edge(0, 0)
+        yield graph
+
+def assert_same_census(first, second, record_triads):
+    if record_triads:
+        assert first[0] == second[0]
+        assert sorted(first[1]) == sorted(second[1])
+        for name in first[1]:
+            assert sorted(first[1][name]) == sorted(second[1][name]), name
+    else:
+        assert first == second
+
+def test_compressed_census():
+    for graph in random_digraphs():
+        csr = sub.CompressedDiGraph(graph)
+        for (disconnected, record) in itertools.product((False, True),
+                repeat=2):
+            assert_same_census(sub.triadic_census(graph,
+                    count_disconnected=disconnected, record_triads=record),
+                    sub.triadic_census(csr, count_disconnected=disconnected,
+                    record_triads=record), record)
+
+def test_mapped_census():
+    for graph in random_digraphs():
+        labels = dict((node, "n%d" % node) for node in graph)
+        named = nx.relabel_nodes(graph, labels)
+        mapping = dict((label, node) for (node, label) in labels.iteritems())
+        for disconnected in (False, True):
+            assert_same_census(sub.triadic_census(named, m=mapping,
+                    count_disconnected=disconnected, record_triads=True),
+                    sub.triadic_census(sub.CompressedDiGraph(named, m=mapping),
+                    count_disconnected=disconnected, record_triads=True), True)
+
+def test_parallel_census():
+    for graph in random_digraphs(num=6):
+        for (disconnected, record) in itertools.product((False, True),
+                repeat=2):
+            assert_same_census(sub.triadic_census(graph,
+                    count_disconnected=disconnected, record_triads=record),
+                    sub.triadic_census(graph, count_disconnected=disconnected,
+                    record_triads=record, n_jobs=2), record)
+
+def test_out_of_core_census():
+    directory = tempfile.mkdtemp()
+    try:
+        for (i, graph) in enumerate(random_digraphs()):
+            path = os.path.join(directory, "links%d.bin" % i)
+            numpy.array(sorted(graph.edges()), dtype=numpy.int32).tofile(path)
+            # small chunks and blocks exercise their boundaries
+            sub.build_csr_index(path, num_nodes=len(graph), chunk_size=7)
+            for disconnected in (False, True):
+                assert sub.out_of_core_triadic_census(path,
+                        count_disconnected=disconnected, num_nodes=len(graph),
+                        block_size=3) == sub.triadic_census(graph,
+                        count_disconnected=disconnected)
+    finally:
+        shutil.rmtree(directory)
+
+def test_incremental_census():
+    generator = numpy.random.RandomState(1)
+    for graph in random_digraphs(num=4):
+        census = sub.IncrementalTriadicCensus(graph, count_disconnected=True)
+        nodes = graph.nodes()
+        for step in xrange(300):
+            choice = generator.randint(4)
+            if choice == 0 and graph.size() > 0:
+                # reverse direction of an existing link, often reciprocating it
+                links = graph.edges()
+                (u, v) = links[generator.randint(len(links))]
+                (src, tar) = (v, u)
+            elif choice == 1:
+                src = tar = nodes[generator.randint(len(nodes))]
+            elif choice == 2 and step % 50 == 0:
+                # occasionally grow the graph by a new node
+                src = nodes[generator.randint(len(nodes))]
+                tar = len(nodes)
+                nodes.append(tar)
+            else:
+                (src, tar) = (nodes[generator.randint(len(nodes))],
+                        nodes[generator.randint(len(nodes))])
+            if graph.has_edge(src, tar):
+                census.remove_edge(src, tar)
+            else:
+                census.add_edge(src, tar)
+            assert census.census() == sub.triadic_census(graph,
+                    count_disconnected=True)
+        census.count_disconnected = False
+        assert census.census() == sub.triadic_census(graph)
+
+def test_windowed_census():
+    generator = numpy.random.RandomState(1)
+    num_nodes = 12
+    # few nodes and coarse times repeat links, also within a single window
+    times = numpy.sort(generator.randint(0, 60, 400))
+    stream = [(int(generator.randint(num_nodes)),
+            int(generator.randint(num_nodes)), int(t)) for t in times]
+    (width, step) = (7, 3)
+    for disconnected in (False, True):
+        (starts, table) = sub.windowed_triadic_census(stream, width, step,
+                nodes=range(num_nodes), count_disconnected=disconnected)
+        assert len(starts) == len(table)
+        assert starts[0] == stream[0][2]
+        assert starts[-1] + width > stream[-1][2]
+        for (begin, row) in zip(starts, table):
+            window = nx.DiGraph()
+            window.add_nodes_from(xrange(num_nodes))
+            window.add_edges_from((u, v) for (u, v, t) in stream if
+                    begin <= t < begin + width)
+            census = sub.triadic_census(window, count_disconnected=True)
+            expected = [census[name] for name in sub.triad_names]
+            if not disconnected:
+                expected[:3] = [0, 0, 0]
+            assert row.tolist() == expected, begin
+
+def brute_intensity(graph):
+    """
+    Sums the geometric mean of the link weights and its ratio to their
+    arithmetic mean over the recorded triads of each type.
+    """
+    (census, triads) = sub.triadic_census(graph, record_triads=True)
+    intensity = dict()
+    coherence = dict()
+    for (name, triples) in triads.iteritems():
+        intensity[name] = 0.0
+        coherence[name] = 0.0
+        for triple in triples:
+            weights = numpy.array([graph[u][v]["weight"] for (u, v) in
+                    itertools.permutations(triple, 2) if graph.has_edge(u, v)])
+            geometric = numpy.exp(numpy.log(weights).mean())
+            intensity[name] += geometric
+            coherence[name] += geometric / weights.mean()
+    return (census, intensity, coherence)
+
+def test_weighted_census():
+    generator = numpy.random.RandomState(1)
+    for graph in random_digraphs(num=6):
+        for (u, v) in graph.edges_iter():
+            graph[u][v]["weight"] = float(generator.exponential(2.0))
+        (census, intensity, coherence) = brute_intensity(graph)
+        for n_jobs in (1, 2):
+            # a small buffer evaluates the triads in several chunks
+            result = sub.weighted_triadic_census(graph, n_jobs=n_jobs,
+                    buffer_size=4)
+            assert result[0] == census
+            for name in census:
+                assert numpy.allclose(result[1][name], intensity[name]), name
+                assert numpy.allclose(result[2][name], coherence[name]), name
+
+def brute_tetradic_census(graph):
+    """
+    Classifies every connected four-node subset by its smallest adjacency
+    matrix over all node permutations, read as a 16-bit number.
+    """
+    census = dict((mtf, 0) for mtf in sub.mtf_sz4_id2num)
+    for quad in itertools.combinations(graph.nodes(), 4):
+        subgraph = graph.subgraph(quad)
+        if not nx.is_weakly_connected(subgraph):
+            continue
+        links = [(u, v) for (u, v) in subgraph.edges_iter() if u != v]
+        smallest = 1 << 16
+        for perm in itertools.permutations(quad):
+            pos = dict((node, i) for (i, node) in enumerate(perm))
+            smallest = min(smallest, sum(1 << (15 - (4 * pos[u] + pos[v]))
+                    for (u, v) in links))
+        census[smallest] += 1
+    return census
+
+def test_tetradic_census():
+    assert len(sub.mtf_sz4_id2num) == 199
+    for seed in xrange(6):
+        graph = nx.gnp_random_graph(12, 0.1 + 0.05 * seed, directed=True,
+                seed=seed)
+        graph.add_edge(0, 0)
+        assert sub.tetradic_census(graph) == brute_tetradic_census(graph)
+
+
+if __name__ == "__main__":
+    test_compressed_census()
+    test_mapped_census()
+    test_parallel_census()
+    test_out_of_core_census()
+    test_incremental_census()
+    test_windowed_census()
+    test_weighted_census()
+    test_tetradic_census()